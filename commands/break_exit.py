@@ -75,15 +75,8 @@ def COMMAND(console, args):
     # Delete the exit. If this was the only exit leading to the destination room,
     # remove this room from the destination room's entrances record.
     del thisroom["exits"][exitid]
-    only_exit_to_destroom = True
-    for ex in thisroom["exits"]:
-        if ex["dest"] == destroom["id"]:
-            only_exit_to_destroom = False
-            break
-    if only_exit_to_destroom:
-        destroom["entrances"].remove(thisroom["id"])
-        console.database.upsert_room(destroom)
     console.database.upsert_room(thisroom)
+    console.database.update_entrances(destroom["id"])
 
     # Finished.
     console.msg("{0}: Done.".format(NAME))
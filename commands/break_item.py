@@ -57,21 +57,17 @@ def COMMAND(console, args):
 
     # The item is duplified, so start by deleting it from every user's inventory.
     if thisitem["duplified"]:
-        for user in console.router.users.values():
-            try:  # Trap to catch a rare crash
-                if itemid in user["console"].user["inventory"]:
-                    user["console"].user["inventory"].remove(itemid)
-                    user["console"].msg("{0} vanished from your inventory.".format(thisitem["name"]))
-                    console.database.upsert_user(user["console"].user)
-            except:
-                with open('break_item_trap.txt', 'w') as file:
-                    file.write("itemid: {0}, u: {1}".format(str(itemid), user))
-                    file.write("console: {0}".format(user["console"]))
-                    file.write("user: {0}".format(user["console"].user))
+        # Only logged in users are looked up, so every console we find has a user record.
+        for user in console.database.users_holding_item(itemid):
+            holder = console.shell.console_by_username(user["name"])
+            if holder and itemid in holder.user["inventory"]:
+                holder.user["inventory"].remove(itemid)
+                holder.msg("{0} vanished from your inventory.".format(thisitem["name"]))
+                console.database.upsert_user(holder.user)
 
     # If the item is duplified or we are a wizard, check all rooms for the presence of the item, and delete.
     if thisitem["duplified"] or console.user["wizard"]:
-        for room in console.database.rooms.all():
+        for room in console.database.rooms_holding_item(itemid):
             if itemid in room["items"]:
                 room["items"].remove(itemid)
                 console.database.upsert_room(room)
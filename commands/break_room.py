@@ -97,21 +97,15 @@ def COMMAND(console, args):
             COMMON.format_item(NAME, thisitem["name"], upper=True)))
         console.database.upsert_user(targetuser)
 
-    # Remove this room from the entrances record of every room it has an exit to.
-    for ex in targetroom["exits"]:
-        destroom = console.database.room_by_id(ex["dest"])
-        if targetroom["id"] in destroom["entrances"]:
-            destroom["entrances"].remove(targetroom["id"])
-            console.database.upsert_room(destroom)
-
     # Unpair all telekey items that are paired to this room.
-    for item in console.database.items.all():
-        if item["telekey"] == roomid:
-            item["telekey"] = None
-            console.database.upsert_item(item)
+    for item in console.database.items_paired_to(roomid):
+        item["telekey"] = None
+        console.database.upsert_item(item)
 
-    # Delete the room.
+    # Delete the room, then remove it from the entrances record of every room it had an exit to.
     console.database.delete_room(targetroom)
+    for destroomid in sorted({ex["dest"] for ex in targetroom["exits"]}):
+        console.database.update_entrances(destroomid)
 
     # Finished.
     console.msg("{0}: Done.".format(NAME))
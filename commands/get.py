@@ -58,15 +58,7 @@ def COMMAND(console, args):
         return False
 
     # Search the current room for the target item.
-    for itemid in thisroom["items"]:
-        # Lookup the target item and perform item checks.
-        thisitem = COMMON.check_item(NAME, console, itemid, reason=False)
-        if not thisitem:
-            console.log.error("Item referenced in room does not exist: {room} :: {item}", room=console.user["room"],
-                              item=itemid)
-            console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, itemid))
-            continue
-
+    for thisitem in COMMON.lookup_items(NAME, console, thisroom):
         # Check for name or id match. Also check if the user prepended "the ".
         if target in [thisitem["name"].lower(), "the " + thisitem["name"].lower()] or str(thisitem["id"]) == target:
             # The item is glued down. Only the owner or a wizard can pick it up.
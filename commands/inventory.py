@@ -43,19 +43,9 @@ def COMMAND(console, args):
 
     # Enumerate our inventory.
     itemcount = 0
-    for itemid in sorted(console.user["inventory"]):
-        # Lookup the target item and perform item checks.
-        thisitem = COMMON.check_item(NAME, console, itemid, reason=False)
-
-        # Uh oh, an item in our inventory doesn't actually exist.
-        if not thisitem:
-            console.log.error("Item referenced in user inventory does not exist: {user} :: {item}",
-                              user=console.user["name"], item=itemid)
-            console.msg("{0}: ERROR: Item referenced in your inventory does not exist: {1}".format(NAME, itemid))
-            continue
-
+    for thisitem in sorted(COMMON.lookup_items(NAME, console), key=lambda item: item["id"]):
         # Show the item's name and ID.
-        console.msg("{0} ({1})".format(thisitem["name"], itemid))
+        console.msg("{0} ({1})".format(thisitem["name"], thisitem["id"]))
 
         # Keep count.
         itemcount += 1
@@ -58,34 +58,33 @@ def COMMAND(console, args):
     if not targetroom:
         return False
 
+    # Find every exit leading to this room, grouped by the entrance source rooms they are in.
+    entrances = {}
+    for srcroomid, exitid in console.database.exits_to(targetroom["id"]):
+        entrances.setdefault(srcroomid, []).append(exitid)
+
     # Are there any entrances?
-    if not targetroom["entrances"]:
+    if not entrances:
         console.msg("{0}: This room has no entrances.".format(NAME))
         return True
 
-    # Scan the entrance source rooms listed for this room.
+    # List the entrance source rooms.
     entcount = 0
-    for ent in sorted(targetroom["entrances"]):
+    for srcroomid in entrances:
         # Lookup the entrance source room and perform room checks.
-        srcroom = COMMON.check_room(NAME, console, ent, reason=False)
+        srcroom = COMMON.check_room(NAME, console, srcroomid, reason=False)
         if not srcroom:
             console.log.error("Entrance source room does not exist for target room: {srcroom} -> {targetroom}",
-                              srcroom=ent, targetroom=roomid)
-            console.msg("{0}: ERROR: Entrance room does not exist: {0}".format(NAME, ent))
+                              srcroom=srcroomid, targetroom=roomid)
+            console.msg("{0}: ERROR: Entrance room does not exist: {1}".format(NAME, srcroomid))
             continue
 
-        # Enumerate the exits in the entrance source room.
-        exits = []
-        for ex in enumerate(srcroom["exits"]):
-            if ex[1]["dest"] == targetroom["id"]:
-                exits.append(ex)
-
         # Format the entrance source room name and ID.
         body = "{0} ({1}) :: ".format(srcroom["name"], srcroom["id"])
 
         # Format the names and IDs of the exits in the entrance source room that lead to this room.
-        for ex in exits:
-            body += "{0} ({1}), ".format(ex[1]["name"], ex[0])
+        for exitid in entrances[srcroomid]:
+            body += "{0} ({1}), ".format(srcroom["exits"][exitid]["name"], exitid)
 
         # Trim extra ', ' from the end of the line and send it.
         body = body[:-2]
@@ -38,8 +38,11 @@ def COMMAND(console, args):
     if not COMMON.check(NAME, console, args, argc=0):
         return False
 
-    # Sort all items in the database by ID.
-    allitems = sorted(console.database.items.all(), key=lambda k: k["id"])
+    # Get the items we own sorted by ID, or all items in the database if we are a wizard.
+    if console.user["wizard"]:
+        allitems = sorted(console.database.items.all(), key=lambda k: k["id"])
+    else:
+        allitems = console.database.items_owned_by(console.user["name"])
 
     # Iterate through the items, checking whether we own each one (or are a wizard),
     # and keeping track of how many items we found.
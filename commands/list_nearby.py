@@ -0,0 +1,84 @@
+#######################
+# Dennis MUD          #
+# list_nearby.py      #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+NAME = "list nearby"
+CATEGORIES = ["exploration", "rooms"]
+USAGE = "list nearby [hops]"
+DESCRIPTION = """List the rooms that can be reached from the room you are in through a few exits.
+
+If a number of hops is provided as an optional argument, list the rooms that can be reached through that many exits
+or fewer. Otherwise, list the rooms that can be reached through 2 exits or fewer.
+The closest rooms are listed first.
+
+Ex. `list nearby` to list the rooms up to 2 exits away.
+Ex2. `list nearby 4` to list the rooms up to 4 exits away."""
+
+# How many exits away to look by default.
+DEFAULT_HOPS = 2
+
+
+def COMMAND(console, args):
+    # Perform initial checks.
+    if not COMMON.check(NAME, console, args, argmax=1):
+        return False
+
+    # Select the given number of hops or the default.
+    if len(args) == 1:
+        # Perform argument type checks and casts.
+        hops = COMMON.check_argtypes(NAME, console, args, checks=[[0, int]], retargs=0)
+        if hops is None:
+            return False
+        if hops < 1:
+            console.msg("{0}: The number of hops must be at least 1.".format(NAME))
+            return False
+    else:
+        hops = DEFAULT_HOPS
+
+    # Lookup the current room and perform room checks.
+    thisroom = COMMON.check_room(NAME, console)
+    if not thisroom:
+        return False
+
+    # Search the exit graph for nearby rooms, and list them.
+    roomcount = 0
+    for roomid, distance in console.database.rooms_within(thisroom["id"], hops):
+        # Lookup the nearby room and perform room checks.
+        nearroom = COMMON.check_room(NAME, console, roomid, reason=False)
+        if not nearroom:
+            console.log.error("Nearby room does not exist: {room}", room=roomid)
+            console.msg("{0}: ERROR: Room does not exist: {1}".format(NAME, roomid))
+            continue
+        console.msg("{0} ({1}) :: {2} {3}".format(nearroom["name"], nearroom["id"], distance,
+                                                  "hop" if distance == 1 else "hops"))
+        roomcount += 1
+
+    # Finished.
+    if not roomcount:
+        console.msg("{0}: There are no rooms nearby.".format(NAME))
+    else:
+        console.msg("{0}: Total rooms: {1}".format(NAME, roomcount))
+    return True
@@ -0,0 +1,67 @@
+#######################
+# Dennis MUD          #
+# list_owned.py       #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+NAME = "list owned"
+CATEGORIES = ["ownership", "users", "wizard"]
+USAGE = "list owned <username>"
+DESCRIPTION = """(WIZARDS ONLY) List all rooms, exits, and items owned by the user <username>.
+
+Ex. `list owned seisatsu`"""
+
+
+def COMMAND(console, args):
+    # Perform initial checks.
+    if not COMMON.check(NAME, console, args, argc=1, wizard=True):
+        return False
+
+    # Make sure the named user exists.
+    targetuser = COMMON.check_user(NAME, console, args[0].lower())
+    if not targetuser:
+        return False
+
+    # Look up everything the user owns.
+    owned = console.database.owned_by(targetuser["name"])
+
+    # List out the rooms.
+    for thisroom in console.database.rooms_owned_by(targetuser["name"]):
+        console.msg("Room: {0} ({1})".format(thisroom["name"], thisroom["id"]))
+
+    # List out the exits, along with the rooms they are in.
+    for roomid, exitid in owned["exits"]:
+        thisroom = console.database.room_by_id(roomid, clean=False)
+        if thisroom and exitid < len(thisroom["exits"]):
+            console.msg("Exit: {0} ({1}) in {2} ({3})".format(thisroom["exits"][exitid]["name"], exitid,
+                                                            thisroom["name"], thisroom["id"]))
+
+    # List out the items.
+    for thisitem in console.database.items_owned_by(targetuser["name"]):
+        console.msg("Item: {0} ({1})".format(thisitem["name"], thisitem["id"]))
+
+    # Report how many of each we found.
+    console.msg("{0}: Total rooms: {1}; exits: {2}; items: {3}".format(NAME, len(owned["rooms"]), len(owned["exits"]),
+                                                                      len(owned["items"])))
+    return True
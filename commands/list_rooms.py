@@ -38,8 +38,11 @@ def COMMAND(console, args):
     if not COMMON.check(NAME, console, args, argc=0):
         return False
 
-    # Sort all rooms in the database by ID.
-    allrooms = sorted(console.database.rooms.all(), key=lambda k: k["id"])
+    # Get the rooms we own sorted by ID, or all rooms in the database if we are a wizard.
+    if console.user["wizard"]:
+        allrooms = sorted(console.database.rooms.all(), key=lambda k: k["id"])
+    else:
+        allrooms = console.database.rooms_owned_by(console.user["name"])
 
     # Iterate through the rooms, checking whether we own each one (or are a wizard),
     # and keeping track of whether we found anything at all.
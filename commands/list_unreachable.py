@@ -0,0 +1,60 @@
+#######################
+# Dennis MUD          #
+# list_unreachable.py #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+NAME = "list unreachable"
+CATEGORIES = ["rooms", "wizard"]
+USAGE = "list unreachable"
+DESCRIPTION = """(WIZARDS ONLY) List all rooms that can't be reached from the first room through exits.
+
+Users can only get to these rooms by teleporting.
+
+Ex. `list unreachable`"""
+
+
+def COMMAND(console, args):
+    # Perform initial checks.
+    if not COMMON.check(NAME, console, args, argc=0, wizard=True):
+        return False
+
+    # Search the exit graph from the first room, and list every room it doesn't reach.
+    roomcount = 0
+    for roomid in console.database.unreachable_rooms(0):
+        # Lookup the unreachable room and perform room checks.
+        thisroom = COMMON.check_room(NAME, console, roomid, reason=False)
+        if not thisroom:
+            console.log.error("Unreachable room does not exist: {room}", room=roomid)
+            console.msg("{0}: ERROR: Room does not exist: {1}".format(NAME, roomid))
+            continue
+        console.msg("{0} ({1})".format(thisroom["name"], thisroom["id"]))
+        roomcount += 1
+
+    # Finished.
+    if not roomcount:
+        console.msg("{0}: Every room can be reached from the first room.".format(NAME))
+    else:
+        console.msg("{0}: Total rooms: {1}".format(NAME, roomcount))
+    return True
@@ -64,7 +64,7 @@ def COMMAND(console, args):
         found_something = True
 
     # Check if someone else is holding the item.
-    for targetuser in console.database.users.all():
+    for targetuser in console.database.users_holding_item(itemid):
         if targetuser["name"] == console.user["name"]:
             continue
         if itemid in targetuser["inventory"]:
@@ -76,7 +76,7 @@ def COMMAND(console, args):
             found_something = True
 
     # Check if the item is in a room.
-    for targetroom in console.database.rooms.all():
+    for targetroom in console.database.rooms_holding_item(itemid):
         if itemid in targetroom["items"]:
             console.msg("{0}: {1} ({2}) is in room: {3} ({4})".format(NAME, thisitem["name"], thisitem["id"],
                                                                      targetroom["name"], targetroom["id"]))
@@ -62,21 +62,17 @@ def COMMAND(console, args):
             console.msg(thisroom["desc"])
 
         # Build and show the user list.
-        userlist = []
-        for user in thisroom["users"]:
-            userlist.append(console.database.user_by_name(user)["nick"])
+        users, missing = console.database.users_by_names(thisroom["users"])
+        if missing:
+            console.log.error("User referenced in room does not exist: {room} :: {user}", room=thisroom["id"],
+                              user=', '.join(missing))
+        userlist = [user["nick"] for user in users]
         console.msg("Occupants: {0}".format(", ".join(userlist)))
 
         # Build and show the item list.
         itemlist = []
-        for itemid in thisroom["items"]:
-            item = console.database.item_by_id(itemid)
-            if item:
-                itemlist.append("{0} ({1})".format(item["name"], item["id"]))
-            else:
-                console.log.error("Item referenced in room does not exist: {room} :: {item}", room=console.user["room"],
-                                  item=itemid)
-                console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, itemid))
+        for item in COMMON.lookup_items(NAME, console, thisroom):
+            itemlist.append("{0} ({1})".format(item["name"], item["id"]))
         if itemlist:
             console.msg("Items: {0}".format(", ".join(itemlist)))
 
@@ -147,14 +143,7 @@ def COMMAND(console, args):
                 return True
 
         # It wasn't us, so maybe it's an item in the room.
-        for itemid in thisroom["items"]:
-            item = console.database.item_by_id(itemid)
-            # A reference was found to a nonexistent item. Report this and continue searching.
-            if not item:
-                console.log.error("Item referenced in room does not exist: {room} :: {item}", room=console.user["room"],
-                                  item=itemid)
-                console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, itemid))
-                continue
+        for item in COMMON.lookup_items(NAME, console, thisroom):
             attributes = []
 
             # Record partial matches.
@@ -180,18 +169,11 @@ def COMMAND(console, args):
                 if item["desc"]:
                     console.msg(item["desc"])
                 found_something = True
-                found_item = itemid
+                found_item = item["id"]
                 break
 
         # Maybe it's an item in our inventory.
-        for itemid in console.user["inventory"]:
-            item = console.database.item_by_id(itemid)
-            # A reference was found to a nonexistent item. Report this and continue searching.
-            if not item:
-                console.log.error("Item referenced in user inventory does not exist: {user} :: {item}",
-                                  user=console.user["name"], item=itemid)
-                console.msg("{0}: ERROR: Item referenced in your inventory does not exist: {1}".format(NAME, itemid))
-                continue
+        for item in COMMON.lookup_items(NAME, console):
             attributes = []
 
             # Record partial matches.
@@ -38,11 +38,11 @@ def COMMAND(console, args):
     if not COMMON.check(NAME, console, args, argmin=1):
         return False
 
-    # Search through all of the rooms.
-    for room in console.database.rooms.all():
-        if room["name"].lower() == ' '.join(args).lower():
-            console.msg("{0}: {1}".format(room["name"], room["id"]))
-            return True
+    # Look up the room by name.
+    room = console.database.room_by_name(' '.join(args))
+    if room:
+        console.msg("{0}: {1}".format(room["name"], room["id"]))
+        return True
 
     # Couldn't find the room.
     console.msg("{0}: Found no such room.".format(NAME))
@@ -118,9 +118,7 @@ def COMMAND(console, args):
     console.database.upsert_room(thisroom)
 
     # If this room is not in the entrance list for the destination room, add it.
-    if console.user["room"] not in destroom["entrances"]:
-        destroom["entrances"].append(console.user["room"])
-        console.database.upsert_room(destroom)
+    console.database.update_entrances(destroomid)
 
     # Show the exit ID.
     console.msg("{0}: Done. (exit id: {1})".format(NAME, len(thisroom["exits"])-1))
@@ -64,24 +64,14 @@ def COMMAND(console, args):
         console.msg("{0}: Very funny.".format(NAME))
         return False
 
-    # Get a list of all items, sorted in reverse order.
-    allitems = sorted(console.database.items.all(), reverse=True, key=lambda k: k["id"])
-
     # Make sure an item by this name does not already exist.
-    for item in allitems:
-        if item["name"].lower() == itemname.lower():
-            console.msg("{0}: An item by this name already exists.".format(NAME))
-            return False
-
-    # Find the highest numbered currently existing item ID.
-    if allitems:
-        lastitem = allitems[0]["id"]
-    else:
-        lastitem = -1
+    if console.database.item_by_name(itemname):
+        console.msg("{0}: An item by this name already exists.".format(NAME))
+        return False
 
-    # Create our new item with an ID one higher than the last item.
+    # Create our new item with the next unused item ID.
     newitem = {
-        "id": lastitem + 1,
+        "id": console.database.new_item_id(),
         "name": itemname,
         "desc": "",
         "action": "",
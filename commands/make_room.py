@@ -67,24 +67,14 @@ def COMMAND(console, args):
         console.msg("{0}: Very funny.".format(NAME))
         return False
 
-    # Get a list of all rooms, sorted in reverse order.
-    allrooms = sorted(console.database.rooms.all(), reverse=True, key=lambda k: k["id"])
-
     # Make sure a room by this name does not already exist.
-    for room in allrooms:
-        if room["name"].lower() == roomname.lower():
-            console.msg("{0}: A room by this name already exists.".format(NAME))
-            return False
-
-    # Find the highest numbered currently existing room ID.
-    if allrooms:
-        lastroom = allrooms[0]["id"]
-    else:
-        lastroom = -1
+    if console.database.room_by_name(roomname):
+        console.msg("{0}: A room by this name already exists.".format(NAME))
+        return False
 
-    # Create our new room with an ID one higher than the last room, and save the room.
+    # Create our new room with the next unused room ID, and save the room.
     newroom = {
-        "id": lastroom + 1,
+        "id": console.database.new_room_id(),
         "name": roomname,
         "desc": "",
         "owners": [console.user["name"]],
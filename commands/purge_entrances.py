@@ -46,41 +46,25 @@ def COMMAND(console, args):
     if not thisroom:
         return False
 
+    # Find every exit leading to this room, grouped by the entrance source rooms they are in.
+    entrances = {}
+    for srcroomid, exitid in console.database.exits_to(thisroom["id"]):
+        entrances.setdefault(srcroomid, []).append(exitid)
+
     # Make sure this room has any entrances.
-    if not thisroom["entrances"]:
+    if not entrances:
         console.msg("{0}: This room has no entrances.".format(NAME))
         return False
 
-    # Scan the entrance source rooms listed for this room.
-    entcount = 0
-    for ent in sorted(thisroom["entrances"]):
-        # Lookup the entrance source room and perform room checks.
-        srcroom = COMMON.check_room(NAME, console, ent, reason=False)
-        if not srcroom:
-            console.log.error("Entrance source room does not exist for target room: {srcroom} -> {targetroom}",
-                              srcroom=ent, targetroom=thisroom["id"])
-            console.msg("{0}: ERROR: Entrance room does not exist: {0}".format(NAME, ent))
-            continue
-
-        # Enumerate the exits in the entrance source room.
-        exits = []
-        for ex in enumerate(srcroom["exits"]):
-            if ex[1]["dest"] == thisroom["id"]:
-                exits.append(ex)
-        entcount += len(exits)
-
-        # Delete the entrances from the source room.
-        offset = 0
-        for ex in exits:
-            del srcroom["exits"][ex[0]-offset]
-            offset += 1
-
-        # Update the source room.
+    # Delete the exits from each entrance source room, starting from the last so that the exit IDs don't change.
+    for srcroomid in entrances:
+        srcroom = console.database.room_by_id(srcroomid)
+        for exitid in reversed(entrances[srcroomid]):
+            del srcroom["exits"][exitid]
         console.database.upsert_room(srcroom)
 
     # Clear the entrance list in the current room, and report.
-    roomcount = len(thisroom["entrances"])
-    thisroom["entrances"] = []
-    console.database.upsert_room(thisroom)
-    console.msg("{0}: Deleted {1} entrances from {2} rooms.".format(NAME, entcount, roomcount))
+    console.database.update_entrances(thisroom["id"])
+    console.msg("{0}: Deleted {1} entrances from {2} rooms.".format(
+        NAME, sum(len(exitids) for exitids in entrances.values()), len(entrances)))
     return True
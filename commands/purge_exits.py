@@ -51,34 +51,20 @@ def COMMAND(console, args):
         console.msg("{0}: This room has no exits.".format(NAME))
         return False
 
-    # Delete each exit in the room, handling destination entrances if necessary.
-    # We delete the exits from a copy of the exit list and then merge it in at the end.
-    # This prevents the exit IDs from changing while we are processing the list.
-    newexitlist = thisroom["exits"].copy()
-    for exitid in range(len(thisroom["exits"])):
-        # Make sure the exit's destination room exists. Otherwise give an error but delete the exit anyway.
-        destroom = COMMON.check_room(NAME, console, thisroom["exits"][exitid]["dest"])
-        if not destroom:
-            console.log.error("Exit destination room does not exist: {roomid}", roomid=destroom["id"])
-            console.msg("ERROR: Exit destination room does not exist: {0}".format(destroom["id"]))
-
-            # Delete the exit, then continue. Since the exit ID is the list index, we are deleting the first
-            # exit in newexitlist each time instead of deleting by index.
-            del newexitlist[0]
-            continue
-
-        else:
-            # Delete the exit. Remove this room from the destination room's entrances record if it is there,
-            # since all of the exits leading from here to there will eventually be gone.
-            del newexitlist[0]
-            if thisroom["id"] in destroom["entrances"]:
-                destroom["entrances"].remove(thisroom["id"])
-                console.database.upsert_room(destroom)
-
-    # Update the exit list in the current room, and report.
+    # Delete every exit in the room.
+    destroomids = sorted({ex["dest"] for ex in thisroom["exits"]})
     excount = len(thisroom["exits"])
-    thisroom["exits"] = newexitlist
+    thisroom["exits"] = []
     console.database.upsert_room(thisroom)
+
+    # Remove this room from the entrances record of every room the exits led to.
+    # If a destination room doesn't exist, give an error, but the exits are deleted anyway.
+    for destroomid in destroomids:
+        if not console.database.update_entrances(destroomid):
+            console.log.error("Exit destination room does not exist: {roomid}", roomid=destroomid)
+            console.msg("ERROR: Exit destination room does not exist: {0}".format(destroomid))
+
+    # Report.
     console.msg("{0}: Deleted {1} exits.".format(NAME, excount))
     return True
 
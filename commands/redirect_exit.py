@@ -69,9 +69,12 @@ def COMMAND(console, args):
         console.msg("{0}: The destination room is inbound sealed.".format(NAME))
         return False
 
-    # Redirect the exit.
+    # Redirect the exit, and update the entrances records of the old and new destination rooms.
+    olddestroomid = thisroom["exits"][exitid]["dest"]
     thisroom["exits"][exitid]["dest"] = destroomid
     console.database.upsert_room(thisroom)
+    console.database.update_entrances(olddestroomid)
+    console.database.update_entrances(destroomid)
 
     # Finished.
     console.msg("{0}: Done.".format(NAME))
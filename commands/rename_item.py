@@ -70,10 +70,10 @@ def COMMAND(console, args):
 
     # Make sure an item by this name does not already exist.
     # Make an exception if that is the item we are renaming. (changing case)
-    for item in console.database.items.all():
-        if item["name"].lower() == itemname.lower() and item["name"].lower() != thisitem["name"].lower():
-            console.msg("{0}: An item by that name already exists.".format(NAME))
-            return False
+    item = console.database.item_by_name(itemname)
+    if item and item["name"].lower() != thisitem["name"].lower():
+        console.msg("{0}: An item by that name already exists.".format(NAME))
+        return False
 
     # Rename the item.
     thisitem["name"] = itemname
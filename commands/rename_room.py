@@ -65,10 +65,10 @@ def COMMAND(console, args):
 
     # Make sure a room by this name does not already exist.
     # Make an exception if that is the room we are renaming. (changing case)
-    for room in console.database.rooms.all():
-        if room["name"].lower() == roomname.lower() and room["name"].lower() != thisroom["name"].lower():
-            console.msg("{0}: A room by that name already exists.".format(NAME))
-            return False
+    room = console.database.room_by_name(roomname)
+    if room and room["name"].lower() != thisroom["name"].lower():
+        console.msg("{0}: A room by that name already exists.".format(NAME))
+        return False
 
     # Rename the room.
     thisroom["name"] = roomname
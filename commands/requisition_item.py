@@ -64,7 +64,7 @@ def COMMAND(console, args):
     # Don't remove duplified items.
     if not thisitem["duplified"]:
         # If the item is in a room's item list, remove it and announce its disappearance.
-        for room in console.database.rooms.all():
+        for room in console.database.rooms_holding_item(itemid):
             if itemid in room["items"]:
                 room["items"].remove(itemid)
                 console.router.broadcast_room(room["id"], "{0} vanished from the room.".format(
@@ -72,12 +72,13 @@ def COMMAND(console, args):
                 console.database.upsert_room(room)
 
         # If the item is in someone's inventory, remove it and announce its disappearance.
-        for user in console.router.users.values():
-            if itemid in user["console"].user["inventory"]:
-                user["console"].user["inventory"].remove(itemid)
-                user["console"].msg("{0} vanished from your inventory.".format(
+        for user in console.database.users_holding_item(itemid):
+            holder = console.shell.console_by_username(user["name"])
+            if holder and itemid in holder.user["inventory"]:
+                holder.user["inventory"].remove(itemid)
+                holder.msg("{0} vanished from your inventory.".format(
                     COMMON.format_item(NAME, thisitem["name"], upper=True)))
-                console.database.upsert_user(user["console"].user)
+                console.database.upsert_user(holder.user)
 
     # Place the item in our inventory and announce its appearance.
     console.user["inventory"].append(itemid)
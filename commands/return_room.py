@@ -49,18 +49,11 @@ def COMMAND(console, args):
         return False
 
     # Cycle through the room, keeping track of how many items we returned and kept.
-    # We also need to copy the room's list of items, or the iterator will break.
+    # The items are looked up before we start removing them from the room.
     retcount = 0
     keepcount = 0
-    itemlist = thisroom["items"].copy()
-    for itemid in itemlist:
-        print("test", itemid)
-        # Lookup the target item and perform item checks.
-        thisitem = COMMON.check_item(NAME, console, itemid, reason=False)
-        if not thisitem:
-            console.log.error("Item in room does not exist: {0} :: {1}".format(console.user["room"], itemid))
-            console.msg("{0}: ERROR: Item in the current room does not exist: {0}".format(NAME, itemid))
-            continue
+    for thisitem in COMMON.lookup_items(NAME, console, thisroom):
+        itemid = thisitem["id"]
 
         # Make sure the item's primary owner exists.
         targetuser = COMMON.check_user(NAME, console, thisitem["owners"][0], live=True, reason=False)
@@ -0,0 +1,92 @@
+#######################
+# Dennis MUD          #
+# route.py            #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+NAME = "route"
+CATEGORIES = ["exploration", "exits"]
+ALIASES = ["find route"]
+USAGE = "route <room_id>"
+DESCRIPTION = """Find the shortest way from the room you are in to the room <room_id>.
+
+Lists the exits to take in order, and which room each one leads to.
+Locked exits are included, so you may still need a key to follow the route.
+
+Ex. `route 0` to find the way back to the first room.
+Ex2. `route 17` to find the way to room 17."""
+
+
+def COMMAND(console, args):
+    # Perform initial checks.
+    if not COMMON.check(NAME, console, args, argc=1):
+        return False
+
+    # Perform argument type checks and casts.
+    destroomid = COMMON.check_argtypes(NAME, console, args, checks=[[0, int]], retargs=0)
+    if destroomid is None:
+        return False
+
+    # Lookup the current room and perform room checks.
+    thisroom = COMMON.check_room(NAME, console)
+    if not thisroom:
+        return False
+
+    # Lookup the destination room and perform room checks.
+    destroom = COMMON.check_room(NAME, console, destroomid)
+    if not destroom:
+        return False
+
+    # Search the exit graph for the route.
+    steps = console.database.route(thisroom["id"], destroom["id"])
+    if steps is None:
+        console.msg("{0}: There is no way to get to that room from here.".format(NAME))
+        return True
+    if not steps:
+        console.msg("{0}: You are already in that room.".format(NAME))
+        return True
+
+    # List each exit to take, and the room it leads to.
+    for srcroomid, exitid in steps:
+        # Lookup the room the exit is in.
+        srcroom = COMMON.check_room(NAME, console, srcroomid, reason=False)
+        if not srcroom:
+            console.log.error("Route passes through a room that does not exist: {room}", room=srcroomid)
+            console.msg("{0}: ERROR: Room does not exist: {1}".format(NAME, srcroomid))
+            return False
+
+        # Lookup the room the exit leads to.
+        ex = srcroom["exits"][exitid]
+        nextroom = COMMON.check_room(NAME, console, ex["dest"], reason=False)
+        if not nextroom:
+            console.log.error("Route passes through a room that does not exist: {room}", room=ex["dest"])
+            console.msg("{0}: ERROR: Room does not exist: {1}".format(NAME, ex["dest"]))
+            return False
+
+        console.msg("{0} ({1}) :: {2} ({3}) -> {4} ({5})".format(srcroom["name"], srcroom["id"], ex["name"], exitid,
+                                                                 nextroom["name"], nextroom["id"]))
+
+    # Finished.
+    console.msg("{0}: Total exits to take: {1}".format(NAME, len(steps)))
+    return True
@@ -0,0 +1,75 @@
+#######################
+# Dennis MUD          #
+# snapshot.py         #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+from lib import backup
+
+NAME = "snapshot"
+CATEGORIES = ["wizard"]
+USAGE = "snapshot"
+DESCRIPTION = """(WIZARDS ONLY) Take a full online backup of the world without pausing the game.
+
+The server forks, and the copy writes the world as it was at that moment while the game carries on.
+You will be told how far along it is, and when it is finished. Only works on Linux servers.
+
+Ex. `snapshot`"""
+
+
+def COMMAND(console, args):
+    # Perform initial checks.
+    if not COMMON.check(NAME, console, args, argc=0, wizard=True):
+        return False
+
+    # Make sure we can take a backup right now.
+    snapshotter = console.database.snapshotter
+    if not snapshotter or not backup.FORK:
+        console.msg("{0}: Online backups are not available on this server.".format(NAME))
+        return False
+    if snapshotter.running:
+        console.msg("{0}: A backup is already running.".format(NAME))
+        return False
+
+    # Report progress roughly every quarter of the way.
+    reported = [0]
+
+    def progress(count, total):
+        quarter = count * 4 // max(total, 1)
+        if quarter > reported[0]:
+            reported[0] = quarter
+            console.msg("{0}: Written {1} of {2} documents.".format(NAME, count, total))
+
+    def done(path, error):
+        if path:
+            console.msg("{0}: Finished backup: {1}".format(NAME, path))
+        else:
+            console.msg("{0}: Backup failed: {1}".format(NAME, error))
+
+    # Fork the backup.
+    if not snapshotter.fork(progress=progress, done=done):
+        console.msg("{0}: Could not start the backup.".format(NAME))
+        return False
+    console.msg("{0}: Started backup.".format(NAME))
+    return True
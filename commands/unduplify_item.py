@@ -70,18 +70,19 @@ def COMMAND(console, args):
         console.msg("{0} appeared in your inventory.".format(COMMON.format_item(NAME, thisitem["name"], upper=True)))
 
     # Delete the item from all user inventories except ours, and announce its disappearance.
-    for user in console.router.users.values():
-        if user["console"].user["name"] == console.user["name"]:
+    for user in console.database.users_holding_item(itemid):
+        if user["name"] == console.user["name"]:
             # Not this user, this is us.
             continue
-        if itemid in user["console"].user["inventory"]:
-            user["console"].user["inventory"].remove(itemid)
-            user["console"].msg("{0} vanished from your inventory.".format(
+        holder = console.shell.console_by_username(user["name"])
+        if holder and itemid in holder.user["inventory"]:
+            holder.user["inventory"].remove(itemid)
+            holder.msg("{0} vanished from your inventory.".format(
                 COMMON.format_item(NAME, thisitem["name"], upper=True)))
-            console.database.upsert_user(user["console"].user)
+            console.database.upsert_user(holder.user)
 
     # Delete the item from all rooms.
-    for room in console.database.rooms.all():
+    for room in console.database.rooms_holding_item(itemid):
         if itemid in room["items"]:
             room["items"].remove(itemid)
             console.database.upsert_room(room)
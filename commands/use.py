@@ -57,15 +57,7 @@ def COMMAND(console, args):
         return False
 
     # Search for the item in our inventory.
-    for itemid in console.user["inventory"]:
-        thisitem = console.database.item_by_id(itemid)
-        # A reference was found to a nonexistent item. Report this and continue searching.
-        if not thisitem:
-            console.log.error("Item referenced in user inventory does not exist: {user} :: {item}",
-                              user=console.user["name"], item=itemid)
-            console.msg("{0}: ERROR: Item referenced in your inventory does not exist: {1}".format(NAME, itemid))
-            continue
-
+    for thisitem in COMMON.lookup_items(NAME, console):
         # Check for name or id match.
         if thisitem["name"].lower() == target or str(thisitem["id"]) == target:
             itemref = thisitem
@@ -73,15 +65,7 @@ def COMMAND(console, args):
 
     # We didn't find it in our inventory, so search for the item in the current room.
     if not itemref:
-        for itemid in thisroom["items"]:
-            thisitem = console.database.item_by_id(itemid)
-            # A reference was found to a nonexistent item. Report this and continue searching.
-            if not thisitem:
-                console.log.error("Item referenced in room does not exist: {room} :: {item}", room=console.user["room"],
-                                  item=itemid)
-                console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, itemid))
-                continue
-
+        for thisitem in COMMON.lookup_items(NAME, console, thisroom):
             # Check for name or id match.
             if thisitem["name"].lower() == target or str(thisitem["id"]) == target:
                 itemref = thisitem
@@ -0,0 +1,535 @@
+#######################
+# Dennis MUD          #
+# backup.py           #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This module contains the world backup rotation done by the server and single user mode on startup.
+#
+# Backups are kept as <world>.bk1 (the newest) to <world>.bkN (the oldest). Rotating them used to copy every backup
+# over the next one before the world was even loaded, which takes minutes for big worlds. Now the world file is only
+# pinned before loading, which is instant, and the rotation happens in a background thread once the game is running.
+# Older backups are shifted along by renaming them, so only the newest backup is actually copied, and even that is
+# skipped if the world hasn't changed since the newest backup was made.
+#
+# It also contains the Snapshotter, which takes online backups of a running world as a base and a series of deltas.
+
+import gc
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+
+from lib import database
+from lib.storage import PagedStorage
+
+# How many bytes to read at a time when hashing a file.
+HASH_CHUNK = 1024 * 1024
+
+# Whether backups can be taken from a forked child process. Forking a threaded process is only safe enough on Linux.
+FORK = sys.platform.startswith("linux")
+
+
+def pin(filename, engine):
+    """Hold on to the world file as it is now, before it is loaded, so that it can be backed up in the background later.
+
+    The json and journal engines always replace the world file rather than writing into it, so a hardlink to it as
+    <world>.bk.pending keeps this version around no matter what happens to the world file afterwards, without copying
+    anything. If hardlinks aren't supported, the file is copied instead. The sqlite engine writes into its database
+    file, so there is nothing to pin; it is copied from the live database by rotate() instead. The paged engine
+    writes its shards separately, so there is no single file to pin, and it isn't supported.
+
+    :param filename: The filename of the world.
+    :param engine: The name of the storage engine.
+
+    :return: True if there is a world to back up, False if there isn't one yet.
+    """
+    if not os.path.exists(filename) or engine == "paged":
+        return False
+    if engine == "sqlite":
+        return True
+
+    # Anything left over from an earlier run that didn't finish its rotation is out of date now.
+    pending = filename + ".bk.pending"
+    if os.path.exists(pending):
+        os.remove(pending)
+    try:
+        os.link(filename, pending)
+    except (OSError, AttributeError):
+        shutil.copyfile(filename, pending)
+    return True
+
+
+def rotate(filename, backups, engine):
+    """Rotate the backups, making the world pinned by pin() the newest one, unless it is identical to the newest one.
+
+    This reads and copies the whole world, so it is meant to be run in a background thread. Hashing and copying
+    release the GIL, so it doesn't hold up the game.
+
+    :param filename: The filename of the world.
+    :param backups: The number of backups to keep.
+    :param engine: The name of the storage engine.
+
+    :return: True if a new backup was made, False if it was skipped because nothing changed.
+    """
+    pending = filename + ".bk.pending"
+    newest = "{0}.bk1".format(filename)
+
+    # Take a consistent copy of the live SQLite database.
+    if engine == "sqlite":
+        _sqlite_copy(filename, pending)
+
+    # Skip the backup if the world is the same as the newest backup.
+    digest = _hash(pending)
+    if os.path.exists(newest) and digest == _newest_hash(filename):
+        os.remove(pending)
+        return False
+
+    # Shift the older backups along by renaming them. The oldest one is replaced.
+    for bn in range(backups - 1, 0, -1):
+        if os.path.exists("{0}.bk{1}".format(filename, bn)):
+            os.replace("{0}.bk{1}".format(filename, bn), "{0}.bk{1}".format(filename, bn + 1))
+
+    # The newest backup has to be a real copy, since the dbupdate scripts write into the world file,
+    # which would change a hardlinked backup along with it.
+    if engine == "sqlite":
+        os.replace(pending, newest)
+    else:
+        shutil.copyfile(pending, newest + ".tmp")
+        os.replace(newest + ".tmp", newest)
+        os.remove(pending)
+    _save_hash(filename, digest)
+    return True
+
+
+def _hash(path):
+    """Hash a file.
+
+    :param path: The filename.
+
+    :return: The SHA-256 hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _newest_hash(filename):
+    """Get the hash of the newest backup, from <world>.bk1.sha256 if it still matches the backup, or else by hashing it.
+
+    :param filename: The filename of the world.
+
+    :return: The SHA-256 hex digest of the newest backup.
+    """
+    newest = "{0}.bk1".format(filename)
+    stat = os.stat(newest)
+    try:
+        with open(newest + ".sha256") as f:
+            saved = json.load(f)
+        if saved["size"] == stat.st_size and saved["mtime"] == stat.st_mtime_ns:
+            return saved["sha256"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return _hash(newest)
+
+
+def _save_hash(filename, digest):
+    """Remember the hash of the newest backup in <world>.bk1.sha256, along with its size and modification time.
+
+    :param filename: The filename of the world.
+    :param digest: The SHA-256 hex digest of the newest backup.
+
+    :return: None
+    """
+    newest = "{0}.bk1".format(filename)
+    stat = os.stat(newest)
+    with open(newest + ".sha256", "w") as f:
+        json.dump({"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}, f)
+
+
+def _sqlite_copy(filename, path):
+    """Copy a live SQLite database with SQLite's backup API, which is safe while it is being written to.
+
+    :param filename: The filename of the database.
+    :param path: The filename of the copy.
+
+    :return: None
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    source = sqlite3.connect(filename)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class Snapshotter:
+    """Snapshotter
+
+    Takes online backups of a running world, so that there are restore points newer than the last startup. Each
+    backup is either a base, holding every document, or a delta, holding only the documents that changed since the
+    previous backup, with None for removed documents. Every full_every backups, and always for the first one in each
+    run, a new base is taken. Backups are gzipped JSON lines files in <world>.backups, named base-<seq>.jsonl.gz and
+    delta-<seq>.jsonl.gz, where seq counts up across runs. The first line of each file is a header, and every other
+    line is a {"table", "doc_id", "doc"} entry. Only the newest keep bases and their deltas are kept.
+
+    Taking a backup happens in two steps, so that the game never stalls for long. take() serializes the documents
+    a chunk at a time from the main thread, and write() compresses and writes them from a background thread.
+    Documents that change while a base is being serialized are serialized again at the end of it, so every backup
+    is a consistent restore point. Use util/dbrestore.py to rebuild a world file from a base and its deltas.
+
+    On Linux, fork() takes a base without pausing the game at all. The process forks, and the child serializes and
+    writes the world exactly as it was at the moment of the fork, while the parent carries on. Memory pages are only
+    copied when one side changes them. The child reports its progress over a pipe, which a thread in the parent
+    watches, passing the reports on to callbacks through call_from_thread.
+
+    Nothing is done until the first backup is taken. Only then is the backup directory created, and changes to the
+    world remembered for the deltas, so a Snapshotter that never takes a backup costs nothing.
+
+    :ivar directory: The directory holding the backups.
+    :ivar full_every: How many backups to take for each base, including the base itself.
+    :ivar keep: How many bases to keep, along with their deltas.
+    :ivar chunk: How many documents to serialize between pauses, or between progress reports from a forked child.
+    :ivar running: Whether a backup is being taken right now.
+    :ivar call_from_thread: Function to run a callback in the main thread, like Twisted's reactor.callFromThread.
+    """
+    def __init__(self, dbman, directory=None, full_every=24, keep=2, chunk=1000):
+        """Snapshotter Initializer
+
+        :param dbman: The DatabaseManager of the running world.
+        :param directory: The directory to keep the backups in. Defaults to <world>.backups.
+        :param full_every: How many backups to take for each base, including the base itself.
+        :param keep: How many bases to keep, along with their deltas.
+        :param chunk: How many documents to serialize between pauses.
+        """
+        self.directory = directory or dbman._filename + ".backups"
+        self.full_every = max(full_every, 1)
+        self.keep = max(keep, 1)
+        self.chunk = chunk
+        self.running = False
+        self.call_from_thread = lambda func, *args: func(*args)
+
+        self._dbman = dbman
+        self._base = None
+        self._since_base = 0
+        self._ready = None
+        self._seq = None
+
+    def take(self):
+        """Serialize the next backup a chunk of documents at a time, from the main thread.
+
+        This is a generator that yields after each chunk, so that the caller can let the game run in between, for
+        example with twisted.internet.task.cooperate(). Once it is exhausted, call write() to write the backup.
+
+        :return: Iterator yielding None after each chunk.
+        """
+        self.running = True
+        self._start()
+        full = self.full_due()
+        header = self._next_header(full)
+        lines = [json.dumps(header)]
+
+        # Everything that changed since the last backup goes in a delta. A base holds everything.
+        changes = self._dbman.take_changes()
+        if full:
+            world = self._dbman.database.storage.read() or {}
+            keys = [(table, doc_id) for table in world for doc_id in world[table]]
+            for start in range(0, len(keys), self.chunk):
+                for table, doc_id in keys[start:start + self.chunk]:
+                    document = world.get(table, {}).get(doc_id)
+                    if document is not None:
+                        lines.append(self._entry(table, doc_id, document))
+                yield
+
+            # Serialize whatever changed in the meantime again, so that later entries win when restoring.
+            changes = self._dbman.take_changes()
+        world = self._dbman.database.storage.read() or {}
+        for table, doc_id in sorted(changes):
+            lines.append(self._entry(table, doc_id, world.get(table, {}).get(doc_id)))
+        self._ready = ("{0}-{1:06d}.jsonl.gz".format(header["type"], self._seq), lines)
+
+    def write(self):
+        """Compress and write the backup serialized by take(), and prune old backups. Meant for a background thread.
+
+        :return: The filename of the new backup.
+        """
+        try:
+            name, lines = self._ready
+            self._ready = None
+            path = os.path.join(self.directory, name)
+            with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(path + ".tmp", path)
+            self._prune()
+            return path
+        finally:
+            self.running = False
+
+    def full_due(self):
+        """Check whether the next backup will be a base.
+
+        :return: True if the next backup will be a base, False if it will be a delta.
+        """
+        return self._base is None or self._since_base >= self.full_every
+
+    def fork(self, progress=None, done=None):
+        """Take a base from a forked child process, without pausing the game. Only works on Linux.
+
+        :param progress: Function to call with the number of documents written so far and the total.
+        :param done: Function to call with the filename of the new base, or None and an error message if it failed.
+
+        :return: True if the backup was started, False if one is already running or forking isn't supported.
+        """
+        if self.running or not FORK:
+            return False
+        self.running = True
+        self._start()
+        header = self._next_header(True)
+        path = os.path.join(self.directory, "base-{0:06d}.jsonl.gz".format(self._seq))
+
+        # The child takes everything up to now with it. The shard files of a paged world keep being replaced while
+        # the child runs, so it reads links to them as they are now.
+        self._dbman.take_changes()
+        if isinstance(self._dbman.database.storage, PagedStorage):
+            shutil.rmtree(path + ".shards", ignore_errors=True)
+            self._dbman.database.storage.pin(path + ".shards")
+
+        # Freeze everything that exists now, so that the garbage collector doesn't touch it in either process,
+        # which would copy its memory pages for nothing.
+        reader, writer = os.pipe()
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            os.close(reader)
+            self._child(writer, header, path)
+        gc.unfreeze()
+        os.close(writer)
+        threading.Thread(target=self._watch, args=(pid, reader, path, progress, done), daemon=True).start()
+        return True
+
+    def _start(self):
+        """Get ready to take the first backup: create the backup directory, carry on the sequence numbers of earlier
+        runs, and start remembering changes to the world. Does nothing after the first time.
+
+        :return: None
+        """
+        if self._seq is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq = max([seq for kind, seq in _backups(self.directory).values()] or [0])
+
+        # Remember every change from now on, since the first base starts from here.
+        self._dbman.track_changes()
+
+    def _next_header(self, full):
+        """Count the next backup, and make its header.
+
+        :param full: Whether the next backup is a base.
+
+        :return: The header dict.
+        """
+        self._seq += 1
+        if full:
+            self._base = self._seq
+            self._since_base = 0
+        self._since_base += 1
+        return {"type": "base" if full else "delta", "seq": self._seq, "base": self._base, "time": time.time(),
+                "version": database.DB_VERSION}
+
+    def _child(self, pipe, header, path):
+        """Write a base from the forked child process, reporting progress over the pipe, then exit.
+
+        Each report is a line: "progress <count> <total>", "done <count> <total>", or "error <message>".
+        Nothing here may touch the reactor, the world file, or the lockfile, which all belong to the parent.
+
+        :param pipe: The file descriptor of the writing end of the pipe.
+        :param header: The header of the base.
+        :param path: The filename of the base.
+
+        :return: Never returns.
+        """
+        code = 1
+        try:
+            gc.disable()
+            report = os.fdopen(pipe, "w")
+
+            # Never write back shards of a paged world, which belong to the parent.
+            if isinstance(self._dbman.database.storage, PagedStorage):
+                self._dbman.database.storage.freeze(path + ".shards")
+            world = self._dbman.database.storage.read() or {}
+            total = sum(len(world[table]) for table in world)
+            count = 0
+            with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+                f.write(json.dumps(header) + "\n")
+                for table in world:
+                    for doc_id, document in world[table].items():
+                        f.write(self._entry(table, doc_id, document) + "\n")
+                        count += 1
+                        if count % self.chunk == 0:
+                            report.write("progress {0} {1}\n".format(count, total))
+                            report.flush()
+            os.replace(path + ".tmp", path)
+            report.write("done {0} {1}\n".format(count, total))
+            report.flush()
+            code = 0
+        except BaseException:
+            try:
+                os.write(pipe, "error {0}\n".format(traceback.format_exc().strip().splitlines()[-1]).encode())
+            except OSError:
+                pass
+        finally:
+            os._exit(code)
+
+    def _watch(self, pid, pipe, path, progress, done):
+        """Pass on the reports of a forked child process until it exits. Runs in a background thread.
+
+        :param pid: The process ID of the child.
+        :param pipe: The file descriptor of the reading end of the pipe.
+        :param path: The filename of the base.
+        :param progress: Function to call with the number of documents written so far and the total.
+        :param done: Function to call with the filename of the new base, or None and an error message if it failed.
+
+        :return: None
+        """
+        finished = False
+        error = "The backup process exited unexpectedly."
+        with os.fdopen(pipe) as report:
+            for line in report:
+                kind, _, rest = line.rstrip("\n").partition(" ")
+                if kind == "progress" and progress:
+                    self.call_from_thread(progress, *[int(n) for n in rest.split()])
+                elif kind == "done":
+                    finished = True
+                elif kind == "error":
+                    error = rest
+        os.waitpid(pid, 0)
+        shutil.rmtree(path + ".shards", ignore_errors=True)
+
+        # Without the base, the next backup has to be a new base.
+        if finished:
+            self._prune()
+        else:
+            self._base = None
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        self.running = False
+        if done:
+            self.call_from_thread(done, path if finished else None, None if finished else error)
+
+    def _entry(self, table, doc_id, document):
+        """Serialize a backup entry.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document, as a string.
+        :param document: The document, or None if it was removed.
+
+        :return: The serialized entry.
+        """
+        return json.dumps({"table": table, "doc_id": doc_id, "doc": document},
+                          **self._dbman.database.storage.kwargs)
+
+    def _prune(self):
+        """Remove all but the newest keep bases, and the deltas belonging to them.
+
+        :return: None
+        """
+        found = _backups(self.directory)
+        bases = sorted(seq for kind, seq in found.values() if kind == "base")
+        if len(bases) <= self.keep:
+            return
+        oldest = bases[-self.keep]
+        for name, (kind, seq) in found.items():
+            if seq < oldest:
+                os.remove(os.path.join(self.directory, name))
+
+
+def _backups(directory):
+    """Find the online backups in a directory.
+
+    :param directory: The directory.
+
+    :return: Dict of filenames to tuples of their kind ("base" or "delta") and sequence number.
+    """
+    found = {}
+    for name in os.listdir(directory):
+        kind, _, rest = name.partition("-")
+        if kind in ["base", "delta"] and rest.endswith(".jsonl.gz") and rest[:-9].isdigit():
+            found[name] = (kind, int(rest[:-9]))
+    return found
+
+
+def read_backup(path):
+    """Read an online backup file.
+
+    :param path: The filename of the backup.
+
+    :return: Tuple of the header dict and a list of entry dicts.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        return header, [json.loads(line) for line in f if line.strip()]
+
+
+def restore(directory, seq=None):
+    """Rebuild a world from the newest online backup, or a given one, by applying its base and then its deltas.
+
+    :param directory: The directory holding the backups.
+    :param seq: The sequence number of the backup to restore, or None for the newest.
+
+    :return: Tuple of the sequence number restored and the world dict, which is empty if there are no backups.
+    """
+    found = sorted(_backups(directory).items(), key=lambda item: item[1][1])
+    if not found:
+        return None, {}
+    if seq is None:
+        seq = found[-1][1][1]
+    target = [name for name, (kind, s) in found if s == seq]
+    if not target:
+        raise FileNotFoundError("No backup with sequence number {0} in {1}".format(seq, directory))
+
+    # Find the base of the backup, then apply it and every delta up to the backup in order.
+    base = read_backup(os.path.join(directory, target[0]))[0]["base"]
+    world = {}
+    for name, (kind, s) in found:
+        if base <= s <= seq:
+            header, entries = read_backup(os.path.join(directory, name))
+            if header["base"] != base:
+                continue
+            for entry in entries:
+                if entry["doc"] is None:
+                    world.get(entry["table"], {}).pop(entry["doc_id"], None)
+                else:
+                    world.setdefault(entry["table"], {})[entry["doc_id"]] = entry["doc"]
+    return seq, world
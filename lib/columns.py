@@ -0,0 +1,149 @@
+#######################
+# Dennis MUD          #
+# columns.py          #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This module contains the columnar mirror of the items table used by the DatabaseManager.
+# It needs NumPy, which is optional. If NumPy isn't installed, the DatabaseManager scans the items table instead.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Number of rows to allocate at first. The arrays double in size whenever they fill up.
+INITIAL_ROWS = 1024
+
+# Flag columns that can be queried with ItemColumns.flagged().
+FLAGS = ["duplified", "glued"]
+
+
+class ItemColumns:
+    """Item Columns
+
+    Keeps a few attributes of every item in NumPy arrays, one row per TinyDB document ID, so that world-wide item
+    queries can run as vectorized masks instead of Python loops over documents. The DatabaseManager keeps it in sync
+    from its index hooks, so it never needs to be written to directly.
+
+    Rows of missing documents are marked dead rather than removed. Telekeys that aren't paired are stored as -1,
+    and primary owners are stored as codes into a list of owner names.
+    """
+    def __init__(self, rows=INITIAL_ROWS):
+        """Item Columns Initializer
+
+        :param rows: The number of rows to allocate at first.
+        """
+        self.live = numpy.zeros(rows, dtype=bool)
+        self.id = numpy.zeros(rows, dtype=numpy.int64)
+        self.telekey = numpy.full(rows, -1, dtype=numpy.int64)
+        self.duplified = numpy.zeros(rows, dtype=bool)
+        self.glued = numpy.zeros(rows, dtype=bool)
+        self.owner = numpy.full(rows, -1, dtype=numpy.int32)
+
+        self._owner_codes = {}
+        self._owner_names = []
+
+    def set(self, doc_id, document):
+        """Copy the attributes of an item document into its row.
+
+        :param doc_id: The TinyDB document ID of the item.
+        :param document: The item document.
+
+        :return: None
+        """
+        if doc_id >= len(self.live):
+            self._grow(doc_id + 1)
+        self.live[doc_id] = True
+        self.id[doc_id] = document["id"]
+        self.telekey[doc_id] = document["telekey"] if type(document["telekey"]) is int else -1
+        self.duplified[doc_id] = bool(document["duplified"])
+        self.glued[doc_id] = bool(document["glued"])
+        self.owner[doc_id] = self._owner_code(document["owners"][0]) if document["owners"] else -1
+
+    def remove(self, doc_id):
+        """Mark the row of a deleted item as dead.
+
+        :param doc_id: The TinyDB document ID of the item.
+
+        :return: None
+        """
+        if doc_id < len(self.live):
+            self.live[doc_id] = False
+
+    def paired_to(self, roomid):
+        """Find the TinyDB document IDs of all telekeys paired to a room.
+
+        :param roomid: The id of the room.
+
+        :return: List of document IDs, in database order.
+        """
+        return numpy.flatnonzero(self.live & (self.telekey == roomid)).tolist()
+
+    def flagged(self, flag):
+        """Find the TinyDB document IDs of all items with a flag set.
+
+        :param flag: The name of the flag. One of FLAGS.
+
+        :return: List of document IDs, in database order.
+        """
+        return numpy.flatnonzero(self.live & getattr(self, flag)).tolist()
+
+    def count_by_owner(self):
+        """Count the items belonging to each primary owner.
+
+        :return: Dict of primary owner names to item counts.
+        """
+        owners = self.owner[self.live & (self.owner >= 0)]
+        counts = numpy.bincount(owners, minlength=len(self._owner_names))
+        return {self._owner_names[code]: int(count) for code, count in enumerate(counts) if count}
+
+    def _owner_code(self, name):
+        """Get the code for an owner name, assigning a new one if needed.
+
+        :param name: The owner name.
+
+        :return: The owner code.
+        """
+        if name not in self._owner_codes:
+            self._owner_codes[name] = len(self._owner_names)
+            self._owner_names.append(name)
+        return self._owner_codes[name]
+
+    def _grow(self, rows):
+        """Enlarge every column to hold at least the given number of rows.
+
+        :param rows: The number of rows needed.
+
+        :return: None
+        """
+        size = len(self.live)
+        while size < rows:
+            size *= 2
+        for column, fill in [("live", False), ("id", 0), ("telekey", -1), ("duplified", False), ("glued", False),
+                             ("owner", -1)]:
+            old = getattr(self, column)
+            new = numpy.full(size, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
@@ -623,6 +623,37 @@ def check_user(NAME, console, username, online=False, wizard=None, room=False, l
     return targetuser
 
 
+def lookup_items(NAME, console, room=None):
+    """Look up every item in a room or in the calling user's inventory at once, reporting any that don't exist.
+
+    :param NAME: The NAME field from the command module.
+    :param console: The calling user's console.
+    :param room: The room document to look in if set. Otherwise look in the calling user's inventory.
+
+    :return: List of item documents, in the order they are listed in the room or inventory.
+    """
+    # Look up all of the items in one pass.
+    if room is not None:
+        items, missing = console.database.items_by_ids(room["items"])
+    else:
+        items, missing = console.database.items_by_ids(console.user["inventory"])
+
+    # References were found to nonexistent items. Report them all together.
+    if missing:
+        missing = ', '.join(str(itemid) for itemid in missing)
+        if room is not None:
+            console.log.error("Item referenced in room does not exist: {room} :: {item}", room=room["id"],
+                              item=missing)
+            console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, missing))
+        else:
+            console.log.error("Item referenced in user inventory does not exist: {user} :: {item}",
+                              user=console.user["name"], item=missing)
+            console.msg("{0}: ERROR: Item referenced in your inventory does not exist: {1}".format(NAME, missing))
+
+    # Return the items that do exist.
+    return items
+
+
 def posture(NAME, console, pname=None, action=None, pitem=None):
     """Helper function for posturing commands like sit, lay, and stand.
 
@@ -660,16 +691,7 @@ def posture(NAME, console, pname=None, action=None, pitem=None):
         return False
 
     # We are going to posture on an item. Look through the room for the named item.
-    for itemid in thisroom["items"]:
-        item = console.database.item_by_id(itemid)
-        # A reference was found to a nonexistent item. Report this and continue searching.
-        if not item:
-            console.log.error("Item referenced in room does not exist: {room} :: {item}",
-                              room=console.user["room"],
-                              item=itemid)
-            console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, itemid))
-            continue
-
+    for item in lookup_items(NAME, console, thisroom):
         # We found the item. Format and broadcast the appropriate action.
         if item["name"].lower() == pitem.lower():
             console["posture"] = pname
@@ -860,30 +882,15 @@ def match_partial(NAME, console, target, objtype, room=True, inventory=True, mes
             return None
 
         if room:
-            for itemid in thisroom["items"]:
-                # Lookup the target item and perform item checks. We have to do this to get the item names.
-                thisitem = COMMON.check_item(NAME, console, itemid, reason=False)
-                if not thisitem:
-                    console.log.error("Item referenced in room does not exist: {room} :: {item}",
-                                      room=console.user["room"], item=itemid)
-                    console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, itemid))
-                    continue
-
+            # Lookup the items in the room. We have to do this to get the item names.
+            for thisitem in lookup_items(NAME, console, thisroom):
                 # Check for partial matches.
                 if target in thisitem["name"].lower() or target.replace("the ", "", 1) in thisitem["name"].lower():
                     partials.append(thisitem["name"].lower())
 
         if inventory:
-            for itemid in console.user["inventory"]:
-                # Lookup the target item and perform item checks. We have to do this to get the item names.
-                thisitem = COMMON.check_item(NAME, console, itemid, reason=False)
-                if not thisitem:
-                    console.log.error("Item referenced in room does not exist: {room} :: {item}",
-                                      room=console.user["room"],
-                                      item=itemid)
-                    console.msg("{0}: ERROR: Item referenced in this room does not exist: {1}".format(NAME, itemid))
-                    continue
-
+            # Lookup the items in our inventory. We have to do this to get the item names.
+            for thisitem in lookup_items(NAME, console):
                 # Check for partial matches.
                 if target in thisitem["name"].lower() or target.replace("the ", "", 1) in thisitem["name"].lower():
                     partials.append(thisitem["name"].lower())
@@ -168,6 +168,8 @@ class ConfigManager:
                                 help="websocket key file to use")
             parser.add_argument("--websocket-cert", nargs=1, dest="websocketcert", type=str, metavar="<filename>",
                                 help="websocket certificate file to use")
+            parser.add_argument("--flush-interval", nargs=1, dest="flushinterval", type=float, metavar="<seconds>",
+                                help="seconds between database flushes, 0 to write every change immediately")
             parser.add_argument("--shutdown-delay", nargs=1, dest="shutdowndelay", type=int, metavar="<seconds>",
                                 help="shutdown delay in seconds")
             parser.add_argument("--disable-commands", nargs=1, dest="disablecommands", type=int,
@@ -308,6 +310,36 @@ class ConfigManager:
                 print(traceback.format_exc(1))
                 sys.exit(2)
 
+        # Fill in optional database settings that older configuration files might not have.
+        # The json engine rewrites the whole world file on every write, like earlier versions did.
+        # A flush interval of 0 means that every change is written to disk immediately.
+        if "engine" not in self.config["database"]:
+            self.config["database"]["engine"] = "json"
+        if "flush_interval" not in self.config["database"]:
+            self.config["database"]["flush_interval"] = 0
+        if "flush_threshold" not in self.config["database"]:
+            self.config["database"]["flush_threshold"] = 0
+        if "records" not in self.config["database"]:
+            self.config["database"]["records"] = False
+        if "snapshot" not in self.config["database"]:
+            self.config["database"]["snapshot"] = True
+
+        # The paged engine keeps this many megabytes of the world in memory, loading this many documents at a time.
+        if "page_budget" not in self.config["database"]:
+            self.config["database"]["page_budget"] = 64
+        if "shard_size" not in self.config["database"]:
+            self.config["database"]["shard_size"] = 1000
+
+        # Online backups are off unless an interval in seconds is set.
+        if "backup_interval" not in self.config["database"]:
+            self.config["database"]["backup_interval"] = 0
+        if "backup_full_every" not in self.config["database"]:
+            self.config["database"]["backup_full_every"] = 24
+        if "backup_keep" not in self.config["database"]:
+            self.config["database"]["backup_keep"] = 2
+        if "backup_fork" not in self.config["database"]:
+            self.config["database"]["backup_fork"] = False
+
         # Parse command line options that are available in both modes.
         if self._cmdline_args.db:
             self.config["database"]["filename"] = self._cmdline_args.db[0]
@@ -364,6 +396,8 @@ class ConfigManager:
                 self.config["websocket"]["key"] = self._cmdline_args.websocketkey[0]
             if self._cmdline_args.websocketcert:
                 self.config["websocket"]["cert"] = self._cmdline_args.websocketcert[0]
+            if self._cmdline_args.flushinterval is not None:
+                self.config["database"]["flush_interval"] = self._cmdline_args.flushinterval[0]
             if self._cmdline_args.shutdowndelay:
                 self.config["shutdown_delay"] = self._cmdline_args.shutdowndelay[0]
             if self._cmdline_args.disablecommands:
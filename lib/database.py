@@ -25,35 +25,100 @@
 # IN THE SOFTWARE.
 # **********
 
+import contextlib
 import json
 import os
+import time
 import traceback
 
+from lib import columns
+from lib import graph
+from lib import records
 from lib.logger import Logger
+from lib.storage import JournalStorage, PagedStorage, ResidentStorage, SQLiteStorage, paused_gc
 
-from tinydb import TinyDB, Query
+from tinydb import TinyDB
 
 DB_VERSION = 5
 
+# The storage backends that can be chosen with the database engine setting.
+ENGINES = {
+    "json": ResidentStorage,
+    "journal": JournalStorage,
+    "sqlite": SQLiteStorage,
+    "paged": PagedStorage
+}
+
 
 class DatabaseManager:
     """The Database Manager
 
     This manager handles interactions with a TinyDB database corresponding to the current game world.
     After documents are pulled from a table and modified, they need to be upserted for the changes to save.
+    The world is kept resident in memory by the storage backend, so queries never touch the disk.
+    The "json" engine rewrites the world file on every write, and the "journal" engine appends changed documents
+    to a journal file instead, periodically compacting them into the world file. The "sqlite" engine keeps the world
+    in an indexed SQLite database, and writes only the rows of changed documents.
+
+    In write-behind mode, upserts and deletions only mark documents dirty, and the world is written to disk
+    when flush() is called, or when the number of dirty documents reaches the flush threshold.
+    The server calls flush() periodically from the reactor, and always before shutting down.
+
+    Several changes can be grouped with the transaction() context manager, so that they are written to disk together
+    in a single flush when it exits. The shell runs every command inside a transaction. It also runs every command
+    inside cached(), so that repeated lookups of a document during the command all return the same object.
+
+    Rooms and items are found through in-memory indexes from their IDs and lowercased names to their TinyDB document
+    IDs, and users through indexes from their lowercased names and nicknames. The indexes are built at startup and kept
+    up to date by the upsert and delete methods. Documents must always be written through those methods, or the indexes
+    will go stale. There are also reverse indexes from each item ID to the rooms and users holding it, from each
+    username to the rooms, items, and exits they own, and from each room ID to the exits leading to it. Nested lists
+    are shared between documents and their stored copies, so we remember what was added to the reverse indexes for
+    each document rather than trusting the stored copy, which may already have been changed in place.
+
+    If records is set, rooms, items, and users are kept in memory as the compact record classes from lib.records
+    instead of dicts. Documents pulled from a table are still dicts, but their exits and other nested parts are records,
+    which act like dicts.
+
+    New room and item IDs come from sequences kept in the _info record, so IDs are never reused and creating a
+    document doesn't need to search the table for the highest ID.
+
+    If snapshot is set, the json and journal engines keep a binary snapshot of the world next to the world file, which
+    is written on a clean shutdown and loads much faster than the world file on the next startup. It is tagged with
+    DB_VERSION, and ignored in favor of the world file if it is stale or corrupt.
+
+    The paged engine keeps only the recently used parts of the rooms, items, and users tables in memory, within
+    page_budget megabytes, and loads the rest from disk as it is needed. In that mode, documents are converted to
+    records and share their repeated data as each part is loaded. Use paging_stats() to see how well the budget fits.
+
+    If NumPy is installed, a columnar mirror of a few item attributes is kept as well, and world-wide item queries
+    like items_paired_to() run against it. Otherwise they fall back to scanning the items table.
+    The exits of every room are likewise kept in a lib.graph.ExitGraph, which route() and the other searches through
+    exits use. Without NumPy, they follow exits one room at a time instead.
 
     :ivar database: The TinyDB database instance for the world.
     :ivar rooms: The table of all rooms in the database.
     :ivar users: The table of all users in the database.
     :ivar items: The table of all items in the database.
     :ivar defaults: The JSON database defaults configuration.
+    :ivar snapshotter: The lib.backup.Snapshotter taking online backups of the world, if any.
     """
-    def __init__(self, filename, defaults, ignorelockfile=False, log=None):
+    def __init__(self, filename, defaults, ignorelockfile=False, log=None, write_behind=False, flush_threshold=0,
+                 engine="json", records=False, snapshot=False, page_budget=64, shard_size=1000):
         """Database Manager Initializer
 
         :param filename: The relative or absolute filename of the TinyDB database file.
         :param defaults: The defaults config dict or pseudo-dict.
+        :param ignorelockfile: Whether to load the database even if a lockfile exists for it.
         :param log: Alternative logging facility, if set. Otherwise use our standard Logger.
+        :param write_behind: Whether to hold changes in memory until flush() is called.
+        :param flush_threshold: In write-behind mode, flush automatically after this many dirty documents. 0 to disable.
+        :param engine: The name of the storage backend to use. One of the keys of ENGINES.
+        :param records: Whether to keep documents in memory as compact records instead of dicts.
+        :param snapshot: Whether to keep a binary snapshot of the world to load from on startup.
+        :param page_budget: For the paged engine, how many megabytes of documents to keep in memory.
+            0 for no limit.
+        :param shard_size: For the paged engine, how many documents to load from disk at a time.
         """
         self.database = None
         self.rooms = None
@@ -61,12 +126,40 @@ class DatabaseManager:
         self.items = None
         self.defaults = defaults
         self.ignorelockfile = ignorelockfile
+        self.snapshotter = None
 
         self._info = None
-        self._users_online = []
+        self._users_online = set()
         self._filename = filename
         self._log = log or Logger("database")
         self._locked = False
+        self._write_behind = write_behind
+        self._flush_threshold = flush_threshold
+        self._engine = engine
+        self._records = records
+        self._snapshot = snapshot
+        self._page_budget = page_budget
+        self._shard_size = shard_size
+        self._dirty = {"rooms": set(), "items": set(), "users": set(), "_info": set()}
+        self._changes = None
+        self._transactions = 0
+        self._caching = 0
+        self._cache = None
+        self._info_id = None
+        self._next_ids = {"rooms": 0, "items": 0}
+        self._room_ids = {}
+        self._item_ids = {}
+        self._room_names = {}
+        self._item_names = {}
+        self._user_names = {}
+        self._user_nicks = {}
+        self._item_rooms = {}
+        self._item_users = {}
+        self._exits_to = {}
+        self._owned = {"rooms": {}, "items": {}, "exits": {}}
+        self._reverse = {"rooms": {}, "items": {}, "users": {}}
+        self._item_columns = None
+        self._exit_graph = None
 
         # This will be changed when running an update tool.
         self._UPDATE_FROM_VERSION = DB_VERSION
@@ -79,6 +172,11 @@ class DatabaseManager:
 
         :return: True if succeeded, False if failed, None if failed due to existing lockfile.
         """
+        # Make sure we know the chosen storage backend.
+        if self._engine not in ENGINES:
+            self._log.critical("Unknown database engine: {engine}", engine=self._engine)
+            return False
+
         # Check if a lockfile exists for this database. If so, then fail, unless we are ignoring lockfiles.
         if os.path.exists(self._filename + ".lock") and not self.ignorelockfile:
             self._log.critical("Lockfile exists for database: {filename}", filename=self._filename)
@@ -105,15 +203,49 @@ class DatabaseManager:
             return False
 
         self._log.info("Loading database: {filename}", filename=self._filename)
-
-        # Try to load the database file. If an error occurs, fail.
+        start = time.perf_counter()
+
+        # Records are written out as plain dicts. The paged engine converts and shares documents whenever it loads a
+        # shard, since it can drop them again later.
+        options = {}
+        if self._records:
+            options["default"] = records.serialize
+        load_hook = records.convert_documents if self._records else None
+        if self._engine == "paged":
+            options.update(budget=int(self._page_budget * 1024 * 1024), shard_size=self._shard_size)
+            load_hook = self._loaded
+
+        # Try to load the database file into memory. If an error occurs, fail.
         try:
-            self.database = TinyDB(self._filename)
+            self.database = TinyDB(self._filename, storage=ENGINES[self._engine],
+                                   snapshot=DB_VERSION if self._snapshot else None, load_hook=load_hook, **options)
         except:
             self._log.critical("Error from TinyDB while loading database: {filename}", filename=self._filename)
             self._log.critical(traceback.format_exc(1))
             return False
 
+        # Report how long each table took to load, and why the snapshot wasn't used if it wasn't.
+        storage = self.database.storage
+        if storage.snapshot_error:
+            self._log.warn("Could not use snapshot ({reason}), loading from the world file instead: {filename}",
+                           reason=storage.snapshot_error, filename=self._filename)
+        for table, seconds in storage.load_times.items():
+            if table is None:
+                self._log.info("Parsed all tables from {source} in {ms:.1f} ms.", source=storage.loaded_from,
+                               ms=seconds * 1000)
+            else:
+                self._log.info("Loaded table {table} from {source} in {ms:.1f} ms.", table=table,
+                               source=storage.loaded_from, ms=seconds * 1000)
+
+        # Report anything that was recovered from the journal.
+        if self._engine == "journal":
+            if self.database.storage.replayed:
+                self._log.info("Replayed {count} changed documents from the journal for database: {filename}",
+                               count=self.database.storage.replayed, filename=self._filename)
+            if self.database.storage.discarded:
+                self._log.warn("Discarded a torn record at the end of the journal for database: {filename}",
+                               filename=self._filename)
+
         # Load the rooms, users, items, and _info tables.
         self.rooms = self.database.table("rooms")
         self.users = self.database.table("users")
@@ -155,19 +287,372 @@ class DatabaseManager:
                 return False
 
         # If there are no rooms, make the initial room.
-        if len(self.rooms.all()) == 0:
+        if len(self.rooms) == 0:
             self._log.info("Initializing rooms table.")
             self._init_room()
 
         # If there are no users, make the root user.
-        if len(self.users.all()) == 0:
+        if len(self.users) == 0:
             self._log.info("Initializing users table.")
             self._init_user()
 
+        # Convert anything the storage didn't already convert to compact records if we are using them, share repeated
+        # user names and default settings between documents so they are only in memory once, and build the indexes.
+        # The paged engine has already done the first two as it loaded each shard, so don't load them all twice.
+        with paused_gc():
+            saved = None
+            if self._engine != "paged":
+                if self._records:
+                    records.convert(self.database.storage.read())
+                saved = records.share_world(self.database.storage.read())
+            self._build_indexes()
+        if saved is not None:
+            self._log.info("Shared repeated data between documents, saving about {saved} bytes of memory.",
+                           saved=saved)
+
+        # From here on, hold changes in memory until they are flushed if we are in write-behind mode.
+        if self._write_behind:
+            self.database.storage.deferred = True
+
         # Finished starting up.
-        self._log.info("Finished loading database.")
+        self._log.info("Finished loading database in {seconds:.2f} seconds.", seconds=time.perf_counter() - start)
         return True
 
+    def flush(self):
+        """Write all changes that are being held in memory to disk.
+
+        This does nothing unless we are in write-behind mode and something has changed since the last flush.
+
+        :return: True if anything was written, False if there was nothing to write.
+        """
+        if self.database is None:
+            return False
+
+        # Count the dirty documents for the log, then write the world and forget them.
+        count = sum(len(self._dirty[table]) for table in self._dirty)
+        try:
+            if not self.database.storage.flush():
+                return False
+        except:
+            self._log.error("Could not flush changes to database: {filename}", filename=self._filename)
+            self._log.error(traceback.format_exc(1))
+            return False
+        for table in self._dirty:
+            self._dirty[table].clear()
+        self._log.debug("Flushed {count} changed documents to disk.", count=count)
+        return True
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group all changes made inside a with block into one unit that is written to disk at once.
+
+        Changes are held in memory until the outermost transaction exits, and are then flushed together,
+        even if an exception was raised. The in-memory world is not rolled back on an exception.
+        In write-behind mode, the flush threshold is only checked once the outermost transaction exits.
+
+        :return: A context manager.
+        """
+        self._transactions += 1
+        if self.database is not None:
+            self.database.storage.deferred = True
+        try:
+            yield
+        finally:
+            self._transactions -= 1
+            if not self._transactions and self.database is not None:
+                if not self._write_behind:
+                    self.database.storage.deferred = False
+                    self.flush()
+                elif self._flush_threshold and sum(len(self._dirty[t]) for t in self._dirty) >= self._flush_threshold:
+                    self.flush()
+
+    @contextlib.contextmanager
+    def cached(self):
+        """Hand out the same document object every time a document is looked up inside a with block.
+
+        Lookups by ID or name of rooms, items, and users that were already made inside the block return the document
+        from the first lookup, without going to storage again, so changes made to it are seen everywhere. Writes through
+        the upsert and delete methods keep the cache up to date. The cache is discarded once the outermost block exits.
+        The shell runs every command inside one, so that nested commands and the COMMON checks share documents.
+
+        :return: A context manager.
+        """
+        self._caching += 1
+        if self._cache is None:
+            self._cache = {"rooms": {}, "items": {}, "users": {}}
+        try:
+            yield
+        finally:
+            self._caching -= 1
+            if not self._caching:
+                self._cache = None
+
+    def track_changes(self):
+        """Start remembering which documents change, for take_changes(). Online backups use this to take deltas.
+
+        :return: None
+        """
+        self._changes = set()
+
+    def take_changes(self):
+        """Report which documents changed since the last call, or since track_changes() was called, and forget them.
+
+        :return: Set of tuples of table names and TinyDB document IDs as strings.
+        """
+        changes = self._changes or set()
+        self._changes = set()
+        return changes
+
+    def paging_stats(self):
+        """Report how often the paged engine found what it needed in memory, for tuning its memory budget.
+
+        :return: Dict of the "hits", "misses", and "evictions" so far, and the number of shards "loaded" and their
+            size in "bytes", or None if we aren't using the paged engine.
+        """
+        if self.database is None or self._engine != "paged":
+            return None
+        return self.database.storage.stats()
+
+    def bytes_written(self):
+        """Report how much has been written to disk since the database was loaded.
+
+        :return: The number of bytes written.
+        """
+        if self.database is None:
+            return 0
+        return self.database.storage.bytes_written
+
+    def _write(self, table, doc_id, document):
+        """Write a single document straight to the storage backend.
+
+        TinyDB rebuilds and rewrites a whole table for every change, so we skip it for documents.
+
+        :param table: The TinyDB table containing the document.
+        :param doc_id: The TinyDB document ID of the document, or None to insert a new document.
+        :param document: The document to write, or None to remove the document.
+
+        :return: The TinyDB document ID.
+        """
+        if doc_id is None:
+            doc_id = table._get_next_id()
+        else:
+            self._unindex_document(table.name, doc_id, self._stored(table.name, doc_id))
+
+        # Forget any other copy of this document handed out inside cached(), so it can't be written back over this.
+        cache = (self._cache or {}).get(table.name)
+        if cache is not None and cache.get(doc_id) is not document:
+            cache.pop(doc_id, None)
+
+        if document is not None:
+            if self._records and table.name in records.TABLES:
+                document = records.TABLES[table.name](document)
+            else:
+                document = dict(document)
+            records.share(table.name, document)
+        self.database.storage.update(table.name, doc_id, document)
+        table.clear_cache()
+        if document is not None:
+            self._index_document(table.name, doc_id, document)
+        self._mark_dirty(table.name, doc_id)
+        return doc_id
+
+    def _loaded(self, table, documents):
+        """Convert and share a batch of documents as the paged engine loads them.
+
+        :param table: The name of the table containing the documents.
+        :param documents: Dict of document IDs to documents.
+
+        :return: None
+        """
+        if self._records:
+            records.convert_documents(table, documents)
+        for doc_id in documents:
+            records.share(table, documents[doc_id])
+
+    def _stored(self, table, doc_id):
+        """Get the raw stored copy of a document, without going through TinyDB.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document.
+
+        :return: The stored document dict, or None if it doesn't exist.
+        """
+        return (self.database.storage.read() or {}).get(table, {}).get(str(doc_id))
+
+    def _build_indexes(self):
+        """Build the in-memory indexes from scratch, from the documents in storage.
+
+        :return: None
+        """
+        self._room_ids = {}
+        self._item_ids = {}
+        self._room_names = {}
+        self._item_names = {}
+        self._user_names = {}
+        self._user_nicks = {}
+        self._item_rooms = {}
+        self._item_users = {}
+        self._exits_to = {}
+        self._owned = {"rooms": {}, "items": {}, "exits": {}}
+        self._reverse = {"rooms": {}, "items": {}, "users": {}}
+        self._item_columns = None
+        if columns.numpy is not None:
+            self._item_columns = columns.ItemColumns()
+        self._exit_graph = None
+        if graph.numpy is not None:
+            self._exit_graph = graph.ExitGraph()
+        self._next_ids = {"rooms": 0, "items": 0}
+        for table in ["rooms", "items", "users"]:
+            for doc_id, document in (self.database.storage.read() or {}).get(table, {}).items():
+                self._index_document(table, int(doc_id), document)
+        if self._exit_graph is not None:
+            self._exit_graph.rebuild()
+
+        # Pick up the ID sequences from the info record. They can only be ahead of the highest existing IDs.
+        info_record = self._info.all()[0]
+        self._info_id = info_record.doc_id
+        for table, nextid in info_record.get("next_ids", {}).items():
+            self._next_ids[table] = max(self._next_ids[table], nextid)
+
+    def _index_document(self, table, doc_id, document):
+        """Add a document to the in-memory indexes.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document.
+        :param document: The document.
+
+        :return: None
+        """
+        if table not in self._reverse:
+            return
+        if table == "rooms":
+            self._room_ids[document["id"]] = doc_id
+            self._room_names[document["name"].lower()] = doc_id
+            if self._exit_graph is not None:
+                self._exit_graph.set(document["id"], [ex["dest"] for ex in document["exits"]])
+        elif table == "items":
+            self._item_ids[document["id"]] = doc_id
+            self._item_names[document["name"].lower()] = doc_id
+            if self._item_columns is not None:
+                self._item_columns.set(doc_id, document)
+        elif table == "users":
+            self._user_names[document["name"].lower()] = doc_id
+            self._user_nicks[document["nick"].lower()] = doc_id
+
+        # Keep the ID sequences ahead of every existing ID.
+        if table in self._next_ids and document["id"] >= self._next_ids[table]:
+            self._next_ids[table] = document["id"] + 1
+
+        # Add the document to the reverse indexes, and remember what we added so we can take it out again.
+        entries = []
+        if table == "rooms":
+            entries += [(self._item_rooms, itemid, doc_id) for itemid in document["items"]]
+            entries += [(self._owned["rooms"], owner, document["id"]) for owner in document["owners"]]
+            for exitid, ex in enumerate(document["exits"]):
+                entries += [(self._owned["exits"], owner, (document["id"], exitid)) for owner in ex["owners"]]
+                entries.append((self._exits_to, ex["dest"], (document["id"], exitid)))
+        elif table == "items":
+            entries += [(self._owned["items"], owner, document["id"]) for owner in document["owners"]]
+        elif table == "users":
+            entries += [(self._item_users, itemid, doc_id) for itemid in document["inventory"]]
+        for index, key, value in entries:
+            index.setdefault(key, set()).add(value)
+        self._reverse[table][doc_id] = entries
+
+    def _unindex_document(self, table, doc_id, document):
+        """Remove a document from the in-memory indexes.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document.
+        :param document: The document as it was indexed, or None if it doesn't exist.
+
+        :return: None
+        """
+        if table not in self._reverse:
+            return
+
+        # Take out whatever this document added to the reverse indexes when it was indexed.
+        for index, key, value in self._reverse[table].pop(doc_id, []):
+            if key in index:
+                index[key].discard(value)
+                if not index[key]:
+                    del index[key]
+
+        if table == "items" and self._item_columns is not None:
+            self._item_columns.remove(doc_id)
+
+        if document is None:
+            return
+        if table == "rooms":
+            if self._room_ids.get(document["id"]) == doc_id:
+                del self._room_ids[document["id"]]
+                if self._exit_graph is not None:
+                    self._exit_graph.remove(document["id"])
+            if self._room_names.get(document["name"].lower()) == doc_id:
+                del self._room_names[document["name"].lower()]
+        elif table == "items":
+            if self._item_ids.get(document["id"]) == doc_id:
+                del self._item_ids[document["id"]]
+            if self._item_names.get(document["name"].lower()) == doc_id:
+                del self._item_names[document["name"].lower()]
+        elif table == "users":
+            if self._user_names.get(document["name"].lower()) == doc_id:
+                del self._user_names[document["name"].lower()]
+            if self._user_nicks.get(document["nick"].lower()) == doc_id:
+                del self._user_nicks[document["nick"].lower()]
+
+    def _next_id(self, table):
+        """Allocate the next ID in a sequence, and save the sequence in the info record.
+
+        :param table: The name of the table to allocate an ID for. Either "rooms" or "items".
+
+        :return: The new ID.
+        """
+        newid = self._next_ids[table]
+        self._next_ids[table] = newid + 1
+        info_record = self._info.get(doc_id=self._info_id)
+        info_record["next_ids"] = dict(self._next_ids)
+        self._write(self._info, self._info_id, info_record)
+        return newid
+
+    def _mark_dirty(self, table, doc_id):
+        """Mark a document as changed since the last flush, and since the last take_changes() if tracking changes.
+
+        If the flush threshold has been reached outside of a transaction, flush right away.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document.
+
+        :return: None
+        """
+        if self._changes is not None:
+            self._changes.add((table, str(doc_id)))
+        if not self._write_behind and not self._transactions:
+            return
+        self._dirty[table].add(doc_id)
+        if self._transactions or not self._flush_threshold:
+            return
+        if sum(len(self._dirty[t]) for t in self._dirty) >= self._flush_threshold:
+            self.flush()
+
+    def new_room_id(self):
+        """Allocate an ID for a new room.
+
+        IDs are never reused, even if the room that had the highest ID is deleted.
+
+        :return: The new room ID.
+        """
+        return self._next_id("rooms")
+
+    def new_item_id(self):
+        """Allocate an ID for a new item.
+
+        IDs are never reused, even if the item that had the highest ID is deleted.
+
+        :return: The new item ID.
+        """
+        return self._next_id("items")
+
     def upsert_room(self, document):
         """Update or insert a room.
 
@@ -178,8 +663,7 @@ class DatabaseManager:
 
         :return: True
         """
-        q = Query()
-        self.rooms.upsert(document, q.id == document["id"])
+        self._write(self.rooms, self._room_ids.get(document["id"]), document)
         return True
 
     def upsert_item(self, document):
@@ -192,8 +676,7 @@ class DatabaseManager:
 
         :return: True
         """
-        q = Query()
-        self.items.upsert(document, q.id == document["id"])
+        self._write(self.items, self._item_ids.get(document["id"]), document)
         return True
 
     def upsert_user(self, document):
@@ -206,8 +689,7 @@ class DatabaseManager:
 
         :return: True
         """
-        q = Query()
-        self.users.upsert(document, q.name == document["name"])
+        self._write(self.users, self._user_names.get(document["name"].lower()), document)
         return True
 
     def delete_room(self, document):
@@ -217,10 +699,10 @@ class DatabaseManager:
 
         :return: True if succeeded, False if the document didn't exist.
         """
-        q = Query()
-        removed = self.rooms.remove(q.id == document["id"])
-        if not removed:
+        doc_id = self._room_ids.get(document["id"])
+        if doc_id is None:
             return False
+        self._write(self.rooms, doc_id, None)
         return True
 
     def delete_item(self, document):
@@ -230,10 +712,10 @@ class DatabaseManager:
 
         :return: True if succeeded, False if the document didn't exist.
         """
-        q = Query()
-        removed = self.items.remove(q.id == document["id"])
-        if not removed:
+        doc_id = self._item_ids.get(document["id"])
+        if doc_id is None:
             return False
+        self._write(self.items, doc_id, None)
         return True
 
     def delete_user(self, document):
@@ -245,12 +727,186 @@ class DatabaseManager:
 
         :return: True if succeeded, False if the document didn't exist.
         """
-        q = Query()
-        removed = self.users.remove(q.name == document["name"])
-        if not removed:
+        doc_id = self._user_names.get(document["name"].lower())
+        if doc_id is None:
             return False
+        self._write(self.users, doc_id, None)
         return True
 
+    def rooms_holding_item(self, itemid):
+        """Get every room whose item list contains an item, without searching the world.
+
+        :param itemid: The id of the item to look for.
+
+        :return: List of room documents, in database order.
+        """
+        return [self.rooms.get(doc_id=doc_id) for doc_id in sorted(self._item_rooms.get(itemid, ()))]
+
+    def users_holding_item(self, itemid):
+        """Get every user whose inventory contains an item, without searching the world.
+
+        If any of these users are logged in, their records need to be altered through their consoles instead.
+
+        :param itemid: The id of the item to look for.
+
+        :return: List of user documents, in database order.
+        """
+        return [self.users.get(doc_id=doc_id) for doc_id in sorted(self._item_users.get(itemid, ()))]
+
+    def rooms_owned_by(self, username):
+        """Get every room a user owns, without searching the world.
+
+        :param username: The name of the user.
+
+        :return: List of room documents, sorted by ID.
+        """
+        return [self.rooms.get(doc_id=self._room_ids[roomid])
+                for roomid in sorted(self._owned["rooms"].get(username.lower(), ())) if roomid in self._room_ids]
+
+    def items_owned_by(self, username):
+        """Get every item a user owns, without searching the world.
+
+        :param username: The name of the user.
+
+        :return: List of item documents, sorted by ID.
+        """
+        return [self.items.get(doc_id=self._item_ids[itemid])
+                for itemid in sorted(self._owned["items"].get(username.lower(), ())) if itemid in self._item_ids]
+
+    def owned_by(self, username):
+        """Find everything a user owns, without searching the world.
+
+        :param username: The name of the user.
+
+        :return: Dict with sorted lists of the "rooms" and "items" IDs, and of the "exits" as (room ID, exit ID) pairs.
+        """
+        username = username.lower()
+        return {kind: sorted(self._owned[kind].get(username, ())) for kind in ["rooms", "items", "exits"]}
+
+    def exits_to(self, roomid):
+        """Find every exit leading to a room, without searching the world.
+
+        :param roomid: The id of the room.
+
+        :return: Sorted list of (room ID, exit ID) pairs, for the rooms the exits are in.
+        """
+        return sorted(self._exits_to.get(roomid, ()))
+
+    def entrances_to(self, roomid):
+        """Find every room with an exit leading to a room, without searching the world.
+
+        This is what the entrances list of the room should hold.
+
+        :param roomid: The id of the room.
+
+        :return: Sorted list of room IDs.
+        """
+        return sorted({srcroomid for srcroomid, exitid in self._exits_to.get(roomid, ())})
+
+    def update_entrances(self, roomid):
+        """Bring the entrances list of a room up to date with the exits leading to it, and save it if it changed.
+
+        Call this for every room that an exit was made, broken, or redirected to or from, after saving the room the
+        exit is in. Rooms that are still entrances keep their place in the list, and new ones are added at the end.
+
+        :param roomid: The id of the room.
+
+        :return: Room document, or None if the room doesn't exist.
+        """
+        thisroom = self.room_by_id(roomid, clean=False)
+        if not thisroom:
+            return None
+        entrances = self.entrances_to(roomid)
+        if sorted(thisroom["entrances"]) != entrances:
+            kept = [srcroomid for srcroomid in thisroom["entrances"] if srcroomid in entrances]
+            thisroom["entrances"] = kept + [srcroomid for srcroomid in entrances if srcroomid not in kept]
+            self.upsert_room(thisroom)
+        return thisroom
+
+    def route(self, srcroomid, destroomid):
+        """Find a shortest route from one room to another through exits, without loading room documents.
+
+        When there are several shortest routes, the one through the lowest room and exit IDs is taken.
+
+        :param srcroomid: The id of the room to start from.
+        :param destroomid: The id of the room to get to.
+
+        :return: List of (room ID, exit ID) pairs for the exits to take in order, or None if there is no route.
+            Empty if the rooms are the same.
+        """
+        if self._exit_graph is not None:
+            return self._exit_graph.route(srcroomid, destroomid)
+        return graph.route(self._exit_dests, srcroomid, destroomid)
+
+    def rooms_within(self, roomid, hops):
+        """Find every room that can be reached from a room through a number of exits or fewer.
+
+        :param roomid: The id of the room to start from.
+        :param hops: The largest number of exits to take.
+
+        :return: List of (room ID, hops) pairs, sorted by hops and then room ID, not including the starting room.
+        """
+        if self._exit_graph is not None:
+            return self._exit_graph.within(roomid, hops)
+        return graph.within(self._exit_dests, roomid, hops)
+
+    def unreachable_rooms(self, roomid=0):
+        """Find every room that can't be reached from a room through exits.
+
+        :param roomid: The id of the room to start from. The nexus by default.
+
+        :return: Sorted list of room IDs.
+        """
+        if self._exit_graph is not None:
+            return self._exit_graph.unreachable(roomid)
+        return graph.unreachable(self._exit_dests, list(self._room_ids), roomid)
+
+    def _exit_dests(self, roomid):
+        """Get the destinations of the exits of a room, for searching without the exit graph.
+
+        :param roomid: The id of the room.
+
+        :return: List of destination room IDs in order of exit ID, or None if the room doesn't exist.
+        """
+        if roomid not in self._room_ids:
+            return None
+        return [ex["dest"] for ex in self._stored("rooms", self._room_ids[roomid])["exits"]]
+
+    def items_paired_to(self, roomid):
+        """Get every telekey item paired to a room.
+
+        :param roomid: The id of the room.
+
+        :return: List of item documents, in database order.
+        """
+        if self._item_columns is not None:
+            return [self.items.get(doc_id=doc_id) for doc_id in self._item_columns.paired_to(roomid)]
+        return [item for item in self.items.all() if item["telekey"] == roomid]
+
+    def items_flagged(self, flag):
+        """Get every item with a flag set, such as all duplified or all glued items.
+
+        :param flag: The name of the flag. Either "duplified" or "glued".
+
+        :return: List of item documents, in database order.
+        """
+        if self._item_columns is not None:
+            return [self.items.get(doc_id=doc_id) for doc_id in self._item_columns.flagged(flag)]
+        return [item for item in self.items.all() if item[flag]]
+
+    def item_counts_by_owner(self):
+        """Count the items belonging to each primary owner.
+
+        :return: Dict of primary owner names to item counts.
+        """
+        if self._item_columns is not None:
+            return self._item_columns.count_by_owner()
+        counts = {}
+        for item in self.items.all():
+            if item["owners"]:
+                counts[item["owners"][0]] = counts.get(item["owners"][0], 0) + 1
+        return counts
+
     def room_by_id(self, roomid, clean=True):
         """Get a room by its id.
 
@@ -259,38 +915,132 @@ class DatabaseManager:
 
         :return: Room document or None.
         """
-        # Search for a room in the database whose ID is the given ID. Assume only one exists.
-        q = Query()
-        thisroom = self.rooms.search(q.id == roomid)
+        # Look up the document ID of the room with the given ID in the index.
+        doc_id = self._room_ids.get(roomid)
 
         # Couldn't find a room with that ID, so return nothing.
-        if not thisroom:
+        if doc_id is None:
             return None
 
-        # TinyDB always returns a list, so take the first item.
-        thisroom = thisroom[0]
+        # Only keep the room in the document cache if it will be cleaned, since cleaning happens in place.
+        thisroom = self._fetch(self.rooms, doc_id, remember=clean)
 
         # If we are not automatically removing offline users from this room, then return the room document right away.
         # Cleaning offline users is usually only disabled for debugging purposes, for example to grab a corrupted
         # room document that won't make it through cleaning so that we can pass it to delete_room().
         if not clean:
             return thisroom
+        return self._clean_room(thisroom)
+
+    def rooms_by_ids(self, roomids, clean=True):
+        """Get several rooms by their ids at once.
+
+        :param roomids: List of the ids of the rooms to retrieve from the database.
+        :param clean: Whether to automatically remove offline user records. Should usually be True.
+
+        :return: Tuple of the list of room documents in the order of their ids, and the list of ids of rooms that
+            don't exist.
+        """
+        rooms, missing = self._get_many(self.rooms, self._room_ids, roomids, remember=clean)
+        if clean:
+            rooms = [self._clean_room(thisroom) for thisroom in rooms]
+        return rooms, missing
 
+    def _clean_room(self, thisroom):
+        """Remove offline user records from a room, saving it if any were removed.
+
+        :param thisroom: The room document.
+
+        :return: The cleaned room document.
+        """
         # For each user in the room, check if they are online. If not, remove them. This used to be done for every room
         # at startup, and took a long time. It is much faster to do it as needed, though not doing it at startup leaves
         # quasi-online ghost users in the record of each room until it is loaded. This doesn't actually matter though.
-        for username in thisroom["users"]:
-            user = self.user_by_name(username)
-            if user and username not in self._users_online:
-                thisroom["users"].remove(username)
+        ghosts = [username for username in thisroom["users"]
+                  if username not in self._users_online and self.user_by_name(username)]
 
-        # Save the room after cleaning out the offline users, and then grab it again.
-        self.upsert_room(thisroom)
-        thisroom = self.rooms.search(q.id == roomid)[0]
+        # Save the room only if we actually cleaned out any offline users, so that reading a room doesn't write to disk.
+        if ghosts:
+            for username in ghosts:
+                thisroom["users"].remove(username)
+            self.upsert_room(thisroom)
 
         # Return the cleaned room document.
         return thisroom
 
+    def _fetch(self, table, doc_id, remember=True):
+        """Get a document by its TinyDB document ID, from the document cache if it is there.
+
+        :param table: The TinyDB table to get the document from.
+        :param doc_id: The TinyDB document ID of the document.
+        :param remember: Whether to keep the document in the cache if it wasn't there, while cached() is active.
+
+        :return: Document or None.
+        """
+        if self._cache is not None and doc_id in self._cache[table.name]:
+            return self._cache[table.name][doc_id]
+        document = table.get(doc_id=doc_id)
+        if remember and self._cache is not None and document is not None:
+            self._cache[table.name][doc_id] = document
+        return document
+
+    def _get_many(self, table, index, keys, remember=True):
+        """Get several documents from a table at once, through one of the indexes.
+
+        The table is only read from storage once, however many documents are asked for.
+
+        :param table: The TinyDB table to get the documents from.
+        :param index: The in-memory index from keys to TinyDB document IDs.
+        :param keys: List of the keys of the documents to retrieve.
+        :param remember: Whether to keep the documents in the cache if they weren't there, while cached() is active.
+
+        :return: Tuple of the list of documents in the order of their keys, and the list of keys that weren't found.
+        """
+        stored = (self.database.storage.read() or {}).get(table.name, {})
+        cache = self._cache[table.name] if self._cache is not None else {}
+        documents = []
+        missing = []
+        for key in keys:
+            doc_id = index.get(key)
+            if doc_id in cache:
+                documents.append(cache[doc_id])
+                continue
+            raw = stored.get(str(doc_id)) if doc_id is not None else None
+            if raw is None:
+                missing.append(key)
+                continue
+            document = table.document_class(raw, doc_id)
+            if remember:
+                cache[doc_id] = document
+            documents.append(document)
+        return documents, missing
+
+    def room_by_name(self, roomname):
+        """Get a room by its name, ignoring case.
+
+        This does not remove offline user records from the room, so use room_by_id() on the result if you need that.
+
+        :param roomname: The name of the room to retrieve from the database.
+
+        :return: Room document or None.
+        """
+        doc_id = self._room_names.get(roomname.lower())
+        if doc_id is None:
+            return None
+        return self._fetch(self.rooms, doc_id, remember=False)
+
+    def item_by_name(self, itemname):
+        """Get an item by its name, ignoring case.
+
+        :param itemname: The name of the item to retrieve from the database.
+
+        :return: Item document or None.
+        """
+        doc_id = self._item_names.get(itemname.lower())
+        if doc_id is None:
+            return None
+        return self._fetch(self.items, doc_id)
+
     def item_by_id(self, itemid):
         """Get an item by its id.
 
@@ -298,11 +1048,20 @@ class DatabaseManager:
 
         :return: Item document or None.
         """
-        q = Query()
-        thisitem = self.items.search(q.id == itemid)
-        if not thisitem:
+        doc_id = self._item_ids.get(itemid)
+        if doc_id is None:
             return None
-        return thisitem[0]
+        return self._fetch(self.items, doc_id)
+
+    def items_by_ids(self, itemids):
+        """Get several items by their ids at once, such as the items in a room or an inventory.
+
+        :param itemids: List of the ids of the items to retrieve from the database.
+
+        :return: Tuple of the list of item documents in the order of their ids, and the list of ids of items that
+            don't exist.
+        """
+        return self._get_many(self.items, self._item_ids, itemids)
 
     def user_by_name(self, username):
         """Get a user by their name.
@@ -314,11 +1073,24 @@ class DatabaseManager:
 
         :return: User document or None.
         """
-        allusers = self.users.all()
-        for user in allusers:
-            if user["name"].lower() == username.lower():
-                return user
-        return None
+        doc_id = self._user_names.get(username.lower())
+        if doc_id is None:
+            return None
+        return self._fetch(self.users, doc_id)
+
+    def users_by_names(self, usernames):
+        """Get several users by their names at once, such as the users in a room.
+
+        The same caveat as user_by_name() applies.
+
+        :param usernames: List of the names of the users to retrieve from the database.
+
+        :return: Tuple of the list of user documents in the order of their names, and the list of names of users
+            that don't exist.
+        """
+        users, missing = self._get_many(self.users, self._user_names, [username.lower() for username in usernames])
+        missing = set(missing)
+        return users, [username for username in usernames if username.lower() in missing]
 
     def user_by_nick(self, nickname):
         """Get a user by their nickname.
@@ -330,11 +1102,10 @@ class DatabaseManager:
 
         :return: User document or None.
         """
-        allusers = self.users.all()
-        for user in allusers:
-            if user["nick"].lower() == nickname.lower():
-                return user
-        return None
+        doc_id = self._user_nicks.get(nickname.lower())
+        if doc_id is None:
+            return None
+        return self._fetch(self.users, doc_id)
 
     def login_user(self, username, passhash):
         """Check if a username and password match an existing user, and log them in.
@@ -364,7 +1135,7 @@ class DatabaseManager:
 
         # Clean and successful login.
         else:
-            self._users_online.append(username)
+            self._users_online.add(username)
             return thisuser
 
     def logout_user(self, username):
@@ -385,7 +1156,7 @@ class DatabaseManager:
         # Still return True since we logged them out.
         elif not thisuser and username in self._users_online:
             self._log.warn("Nonexistent user was online: {username}", username=username)
-            self._users_online.remove(username)
+            self._users_online.discard(username)
             return True
 
         # Attempt to log out user who was not logged in.
@@ -395,7 +1166,7 @@ class DatabaseManager:
 
         # Clean and successful logout.
         else:
-            self._users_online.remove(username)
+            self._users_online.discard(username)
             return True
 
     def online(self, username):
@@ -457,10 +1228,20 @@ class DatabaseManager:
         return True
 
     def _unlock(self):
-        """Clean up the lockfile before exiting.
+        """Flush any changes held in memory, and clean up the lockfile before exiting.
 
         :return: None
         """
+        # Make sure nothing held in memory is lost on shutdown, and let the storage backend clean up.
+        self.flush()
+        stats = self.paging_stats()
+        if stats:
+            self._log.info("Paging: {hits} hits, {misses} misses, {evictions} evictions, {loaded} shards loaded.",
+                           **stats)
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+
         # We never got around to making a lockfile.
         if not self._locked:
             return
@@ -0,0 +1,335 @@
+#######################
+# Dennis MUD          #
+# graph.py            #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This module contains the exit graph used by the DatabaseManager to find routes between rooms.
+# The ExitGraph needs NumPy, which is optional. If NumPy isn't installed, the DatabaseManager runs the same searches
+# one room at a time with the functions at the bottom of this module instead.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Number of rooms to allocate at first. The arrays double in size whenever they fill up.
+INITIAL_ROOMS = 1024
+
+# Rebuild the arrays once more than this many rooms, or this fraction of all rooms, have changed since the last build.
+REBUILD_CHANGES = 1024
+REBUILD_FRACTION = 1 / 8
+
+
+class ExitGraph:
+    """Exit Graph
+
+    Keeps the exits of every room as a directed graph in compressed sparse row form, so that routes and neighborhoods
+    can be found without touching room documents. The destinations of all exits are kept in one NumPy array, ordered
+    by room ID and then exit ID, along with an array of where the exits of each room start. Searches are breadth-first,
+    expanding a whole level at a time with vectorized array operations.
+
+    The DatabaseManager keeps it in sync from its index hooks, so it never needs to be written to directly. The exits
+    of rooms that changed since the arrays were built are kept in a dict on the side, and the arrays are rebuilt once
+    enough of them pile up.
+
+    Rows are indexed by room ID. Exits leading to rooms that don't exist are kept, but never followed. When a room can
+    be reached in several ways, searches take the one through the lowest room ID and then the lowest exit ID.
+    """
+    def __init__(self, rooms=INITIAL_ROOMS):
+        """Exit Graph Initializer
+
+        :param rooms: The number of rooms to allocate at first.
+        """
+        self.live = numpy.zeros(rooms, dtype=bool)
+        self.indptr = numpy.zeros(rooms + 1, dtype=numpy.int64)
+        self.indices = numpy.zeros(0, dtype=numpy.int64)
+
+        self._stale = numpy.zeros(rooms, dtype=bool)
+        self._changed = {}
+
+    def set(self, roomid, dests):
+        """Set the exits of a room.
+
+        :param roomid: The id of the room.
+        :param dests: List of the destination room IDs of its exits, in order of exit ID.
+
+        :return: None
+        """
+        if roomid >= len(self.live):
+            self._grow(roomid + 1)
+        self.live[roomid] = True
+        self._stale[roomid] = True
+        self._changed[roomid] = [dest if type(dest) is int else -1 for dest in dests]
+        if len(self._changed) > max(REBUILD_CHANGES, len(self.live) * REBUILD_FRACTION):
+            self.rebuild()
+
+    def remove(self, roomid):
+        """Remove a room and its exits.
+
+        :param roomid: The id of the room.
+
+        :return: None
+        """
+        if roomid < len(self.live):
+            self.live[roomid] = False
+            self._stale[roomid] = True
+            self._changed[roomid] = []
+
+    def rebuild(self):
+        """Rebuild the arrays, folding in every room that changed since they were last built.
+
+        :return: None
+        """
+        if not self._changed:
+            return
+        rooms = len(self.live)
+
+        # Keep the exits of unchanged rooms, and add the exits of changed ones. A stable sort by room ID puts them
+        # in place, since each room's exits come from only one of the two and are already in order.
+        rows = numpy.repeat(numpy.arange(rooms), numpy.diff(self.indptr))
+        keep = ~self._stale[rows]
+        changed = sorted(self._changed)
+        changed_rows = numpy.repeat(numpy.array(changed, dtype=numpy.int64),
+                                    [len(self._changed[roomid]) for roomid in changed])
+        changed_dests = numpy.array([dest for roomid in changed for dest in self._changed[roomid]], dtype=numpy.int64)
+        rows = numpy.concatenate([rows[keep], changed_rows])
+        order = numpy.argsort(rows, kind="stable")
+        self.indices = numpy.concatenate([self.indices[keep], changed_dests])[order]
+        self.indptr = numpy.zeros(rooms + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(rows, minlength=rooms), out=self.indptr[1:])
+
+        self._stale[:] = False
+        self._changed.clear()
+
+    def route(self, start, goal):
+        """Find a shortest route between two rooms.
+
+        :param start: The id of the room to start from.
+        :param goal: The id of the room to get to.
+
+        :return: List of (room ID, exit ID) pairs for the exits to take in order, or None if there is no route.
+        """
+        if not self._exists(start) or not self._exists(goal):
+            return None
+        distance, parent, via = self._search(start, goal=goal)
+        if distance[goal] < 0:
+            return None
+        steps = []
+        while goal != start:
+            steps.append((int(parent[goal]), int(via[goal])))
+            goal = int(parent[goal])
+        return steps[::-1]
+
+    def within(self, start, hops):
+        """Find every room that can be reached from a room in a number of hops or fewer.
+
+        :param start: The id of the room to start from.
+        :param hops: The largest number of exits to take.
+
+        :return: List of (room ID, hops) pairs, sorted by hops and then room ID, not including the starting room.
+        """
+        if not self._exists(start):
+            return []
+        distance = self._search(start, hops=hops)[0]
+        reached = numpy.flatnonzero(distance > 0)
+        order = numpy.argsort(distance[reached], kind="stable")
+        return list(zip(reached[order].tolist(), distance[reached][order].tolist()))
+
+    def unreachable(self, start):
+        """Find every room that can't be reached from a room.
+
+        :param start: The id of the room to start from.
+
+        :return: Sorted list of room IDs.
+        """
+        if not self._exists(start):
+            return numpy.flatnonzero(self.live).tolist()
+        distance = self._search(start)[0]
+        return numpy.flatnonzero(self.live & (distance < 0)).tolist()
+
+    def _exists(self, roomid):
+        """Check whether a room exists.
+
+        :param roomid: The id of the room.
+
+        :return: True if the room exists, False if not.
+        """
+        return type(roomid) is int and 0 <= roomid < len(self.live) and bool(self.live[roomid])
+
+    def _expand(self, frontier):
+        """Follow every exit of a set of rooms.
+
+        :param frontier: Array of room IDs, in order.
+
+        :return: Tuple of arrays of the room IDs, exit IDs, and destination room IDs of every exit leading to a room
+            that exists, ordered by room ID and then exit ID.
+        """
+        # Exits of rooms that haven't changed since the arrays were built.
+        rooms = frontier[~self._stale[frontier]]
+        starts = self.indptr[rooms]
+        counts = self.indptr[rooms + 1] - starts
+        sources = numpy.repeat(rooms, counts)
+        exitids = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        dests = self.indices[numpy.repeat(starts, counts) + exitids]
+
+        # Exits of rooms that changed.
+        changed = [(roomid, exitid, dest) for roomid in frontier[self._stale[frontier]].tolist()
+                   for exitid, dest in enumerate(self._changed[roomid])]
+        if changed:
+            changed = numpy.array(changed, dtype=numpy.int64)
+            order = numpy.argsort(numpy.concatenate([sources, changed[:, 0]]), kind="stable")
+            sources = numpy.concatenate([sources, changed[:, 0]])[order]
+            exitids = numpy.concatenate([exitids, changed[:, 1]])[order]
+            dests = numpy.concatenate([dests, changed[:, 2]])[order]
+
+        # Never follow exits to rooms that don't exist.
+        valid = (dests >= 0) & (dests < len(self.live))
+        valid[valid] = self.live[dests[valid]]
+        return sources[valid], exitids[valid], dests[valid]
+
+    def _search(self, start, goal=None, hops=None):
+        """Search breadth-first from a room, a whole level at a time.
+
+        :param start: The id of the room to start from, which must exist.
+        :param goal: The id of a room to stop at once it is reached, if any.
+        :param hops: The largest number of exits to take, if any.
+
+        :return: Tuple of arrays of the number of hops to each room, the room each room was reached from, and the exit
+            it was reached through, indexed by room ID. Rooms that weren't reached have -1 in every array.
+        """
+        distance = numpy.full(len(self.live), -1, dtype=numpy.int64)
+        parent = numpy.full(len(self.live), -1, dtype=numpy.int64)
+        via = numpy.full(len(self.live), -1, dtype=numpy.int64)
+        distance[start] = 0
+        frontier = numpy.array([start], dtype=numpy.int64)
+        level = 0
+        while len(frontier) and (hops is None or level < hops) and (goal is None or distance[goal] < 0):
+            sources, exitids, dests = self._expand(frontier)
+
+            # Keep the first way each newly reached room was reached.
+            new = distance[dests] < 0
+            frontier, first = numpy.unique(dests[new], return_index=True)
+            level += 1
+            distance[frontier] = level
+            parent[frontier] = sources[new][first]
+            via[frontier] = exitids[new][first]
+        return distance, parent, via
+
+    def _grow(self, rooms):
+        """Enlarge the arrays to hold at least the given number of rooms.
+
+        :param rooms: The number of rooms needed.
+
+        :return: None
+        """
+        size = len(self.live)
+        while size < rooms:
+            size *= 2
+        for name in ["live", "_stale"]:
+            old = getattr(self, name)
+            new = numpy.zeros(size, dtype=bool)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        indptr = numpy.full(size + 1, self.indptr[-1], dtype=numpy.int64)
+        indptr[:len(self.indptr)] = self.indptr
+        self.indptr = indptr
+
+
+def search(exits, start, goal=None, hops=None):
+    """Search breadth-first from a room, one room at a time, like ExitGraph does without NumPy.
+
+    :param exits: Function returning the list of the destination room IDs of a room's exits, or None if it doesn't
+        exist.
+    :param start: The id of the room to start from.
+    :param goal: The id of a room to stop at once it is reached, if any.
+    :param hops: The largest number of exits to take, if any.
+
+    :return: Dict of the IDs of reached rooms to tuples of their hops, the room they were reached from, and the exit
+        they were reached through. Empty if the starting room doesn't exist.
+    """
+    if exits(start) is None:
+        return {}
+    reached = {start: (0, None, None)}
+    frontier = [start]
+    level = 0
+    while frontier and (hops is None or level < hops) and (goal is None or goal not in reached):
+        level += 1
+        found = []
+        for roomid in frontier:
+            for exitid, dest in enumerate(exits(roomid)):
+                if dest not in reached and exits(dest) is not None:
+                    reached[dest] = (level, roomid, exitid)
+                    found.append(dest)
+        frontier = sorted(found)
+    return reached
+
+
+def route(exits, start, goal):
+    """Find a shortest route between two rooms, one room at a time. See ExitGraph.route().
+
+    :param exits: Function returning the list of the destination room IDs of a room's exits, or None if it doesn't
+        exist.
+    :param start: The id of the room to start from.
+    :param goal: The id of the room to get to.
+
+    :return: List of (room ID, exit ID) pairs for the exits to take in order, or None if there is no route.
+    """
+    reached = search(exits, start, goal=goal)
+    if goal not in reached:
+        return None
+    steps = []
+    while goal != start:
+        steps.append(reached[goal][1:])
+        goal = reached[goal][1]
+    return steps[::-1]
+
+
+def within(exits, start, hops):
+    """Find every room that can be reached from a room in a number of hops or fewer, one room at a time.
+    See ExitGraph.within().
+
+    :param exits: Function returning the list of the destination room IDs of a room's exits, or None if it doesn't
+        exist.
+    :param start: The id of the room to start from.
+    :param hops: The largest number of exits to take.
+
+    :return: List of (room ID, hops) pairs, sorted by hops and then room ID, not including the starting room.
+    """
+    reached = search(exits, start, hops=hops)
+    return sorted(((roomid, reached[roomid][0]) for roomid in reached if roomid != start), key=lambda r: (r[1], r[0]))
+
+
+def unreachable(exits, roomids, start):
+    """Find every room that can't be reached from a room, one room at a time. See ExitGraph.unreachable().
+
+    :param exits: Function returning the list of the destination room IDs of a room's exits, or None if it doesn't
+        exist.
+    :param roomids: The IDs of every room.
+    :param start: The id of the room to start from.
+
+    :return: Sorted list of room IDs.
+    """
+    reached = search(exits, start)
+    return sorted(roomid for roomid in roomids if roomid not in reached)
@@ -0,0 +1,365 @@
+#######################
+# Dennis MUD          #
+# records.py          #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This module contains the compact record classes that the DatabaseManager can keep world documents in,
+# and the helpers that share repeated data between documents to save memory.
+
+import sys
+
+from collections.abc import MutableMapping
+
+
+def _record(cls):
+    """Make a converter that turns a plain dict into a record of the given class.
+
+    :param cls: The record class.
+
+    :return: The converter function.
+    """
+    def convert(value):
+        return cls(value) if type(value) is dict else value
+    return convert
+
+
+def _records(cls):
+    """Make a converter that turns the plain dicts in a list into records of the given class.
+
+    :param cls: The record class.
+
+    :return: The converter function.
+    """
+    def convert(value):
+        if type(value) is list and any(type(element) is dict for element in value):
+            return [cls(element) if type(element) is dict else element for element in value]
+        return value
+    return convert
+
+
+class Record(MutableMapping):
+    """Record
+
+    Base class for the record classes. A record stores the fields of a document in __slots__ instead of a dict, which
+    takes much less memory, while still acting like a dict so that command modules keep working unchanged.
+    Nested dicts are converted to records when they are assigned. Fields that aren't part of the record class are kept
+    in a small dict on the side, so that no data is lost from unusual documents.
+
+    Subclasses list their fields in __slots__, and may map fields to converters in _nested. A field can hide a dict
+    method of the same name, like the items field of a room does, so code that may be handed a record should iterate
+    over its keys rather than calling items().
+
+    Nested records that hold default values are shared between every document that has them. Reading one through a
+    key returns a private copy, so that changes to it never affect other documents. Records that are handed out by
+    reference rather than copied, like exits, keep that private copy in place of the shared one. Never change a nested
+    record reached through attribute access.
+    """
+    __slots__ = ("_extra",)
+    _nested = {}
+    _fields = frozenset()
+    _keep_unshared = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.__slots__)
+
+    def __init__(self, document=None):
+        """Record Initializer
+
+        :param document: The document dict to copy fields from, if any.
+        """
+        self._extra = None
+        if document:
+            for key in document:
+                self[key] = document[key]
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+
+            # Don't let anyone change a shared record.
+            if key in self._nested and value is _SHARED.get(type(value)):
+                value = type(value)(value)
+                if self._keep_unshared:
+                    setattr(self, key, value)
+            return value
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            if key in self._nested:
+                value = self._nested[key](value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fields:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for key in self.__slots__ if hasattr(self, key)) + len(self._extra or ())
+
+    def __contains__(self, key):
+        if key in self._fields:
+            return hasattr(self, key)
+        return bool(self._extra) and key in self._extra
+
+    def __eq__(self, other):
+        if not isinstance(other, (Record, dict)):
+            return NotImplemented
+        return len(self) == len(other) and all(key in other and self._raw(key) == other[key] for key in self)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{0}({1!r})".format(type(self).__name__, {key: self._raw(key) for key in self})
+
+    def _raw(self, key):
+        """Get a field without copying it if it is shared. The value must not be changed.
+
+        :param key: The name of the field.
+
+        :return: The value of the field.
+        """
+        if key in self._fields:
+            return getattr(self, key)
+        return self._extra[key]
+
+    def _share(self, dropped):
+        """Replace nested records that hold default values with the shared ones.
+
+        :param dropped: Dict of the IDs of replaced objects to the objects, for counting the memory saved.
+
+        :return: None
+        """
+        for key in self._nested:
+            value = getattr(self, key, None)
+            shared = _SHARED.get(type(value))
+            if shared is not None and value is not shared and value == shared:
+                setattr(self, key, shared)
+                dropped[id(value)] = value
+
+
+class Sealed(Record):
+    """The sealed settings of a room."""
+    __slots__ = ("inbound", "outbound")
+
+
+class ExitAction(Record):
+    """The action texts of an exit."""
+    __slots__ = ("go", "locked", "entrance")
+
+
+class Exit(Record):
+    """An exit, as found in the exits list of a room."""
+    __slots__ = ("dest", "name", "desc", "owners", "key", "key_hidden", "locked", "action")
+    _nested = {"action": _record(ExitAction)}
+    _keep_unshared = True
+
+
+class Room(Record):
+    """A room document."""
+    __slots__ = ("id", "name", "desc", "owners", "users", "exits", "entrances", "items", "sealed")
+    _nested = {"exits": _records(Exit), "sealed": _record(Sealed)}
+
+
+class Item(Record):
+    """An item document."""
+    __slots__ = ("id", "name", "desc", "action", "owners", "glued", "duplified", "telekey")
+
+
+class Autolook(Record):
+    """The autolook settings of a user."""
+    __slots__ = ("enabled",)
+
+
+class Chat(Record):
+    """The chat settings of a user."""
+    __slots__ = ("enabled", "ignored")
+
+
+class User(Record):
+    """A user document."""
+    __slots__ = ("name", "nick", "desc", "passhash", "room", "inventory", "pronouns", "wizard", "autolook", "chat")
+    _nested = {"autolook": _record(Autolook), "chat": _record(Chat)}
+
+
+# The record class for the documents of each table.
+TABLES = {
+    "rooms": Room,
+    "items": Item,
+    "users": User
+}
+
+# Nested records holding default values, which are shared between every document that has them.
+_SHARED = {
+    Sealed: Sealed({"inbound": False, "outbound": False}),
+    ExitAction: ExitAction({"go": "", "locked": "", "entrance": ""})
+}
+
+# Fields holding lists of user names, which repeat all over the world.
+NAME_LISTS = {
+    "rooms": ["owners", "users"],
+    "items": ["owners"],
+    "exits": ["owners"]
+}
+
+
+def convert(data):
+    """Convert every document in the world that isn't a record yet to records, in place.
+
+    :param data: The in-memory world dict, as returned by the storage.
+
+    :return: None
+    """
+    for table in TABLES:
+        documents = (data or {}).get(table)
+        if documents:
+            convert_documents(table, documents)
+
+
+def convert_documents(table, documents):
+    """Convert documents that aren't records yet to records, in place. The storage can call this as it loads the world.
+
+    :param table: The name of the table containing the documents.
+    :param documents: Dict of document IDs to documents.
+
+    :return: None
+    """
+    cls = TABLES.get(table)
+    if cls:
+        for doc_id in documents:
+            if type(documents[doc_id]) is dict:
+                documents[doc_id] = cls(documents[doc_id])
+
+
+def share(table, document, dropped=None):
+    """Intern the user names in a document, and share its nested records that hold default values, in place.
+
+    :param table: The name of the table containing the document.
+    :param document: The document.
+    :param dropped: Dict of the IDs of replaced objects to the objects, for counting the memory saved, if wanted.
+
+    :return: None
+    """
+    if dropped is None:
+        dropped = {}
+    _intern_lists(NAME_LISTS.get(table, ()), document, dropped)
+    if table == "rooms":
+        for ex in document.get("exits", ()):
+            _intern_lists(NAME_LISTS["exits"], ex, dropped)
+            if isinstance(ex, Record):
+                ex._share(dropped)
+    elif table == "users":
+        for key in ["name", "pronouns"]:
+            if type(document.get(key)) is str:
+                document[key] = _intern(document[key], dropped)
+        if isinstance(document.get("chat"), Record):
+            _intern_lists(["ignored"], document["chat"], dropped)
+    if isinstance(document, Record):
+        document._share(dropped)
+
+
+def share_world(data):
+    """Intern repeated identifiers throughout the world, and share nested records that hold default values, in place.
+
+    The keys of documents that are dicts are already shared by the storage, which parses each table in one go.
+
+    :param data: The in-memory world dict, as returned by the storage.
+
+    :return: The number of bytes saved, roughly.
+    """
+    dropped = {}
+    for table in TABLES:
+        documents = (data or {}).get(table)
+        if documents:
+            for doc_id in documents:
+                share(table, documents[doc_id], dropped)
+    return sum(sys.getsizeof(obj) for obj in dropped.values())
+
+
+def _intern(value, dropped):
+    """Intern a string.
+
+    :param value: The string.
+    :param dropped: Dict of the IDs of replaced objects to the objects.
+
+    :return: The interned string.
+    """
+    interned = sys.intern(value)
+    if interned is not value:
+        dropped[id(value)] = value
+    return interned
+
+
+def _intern_lists(keys, document, dropped):
+    """Intern the strings in some lists of a document, in place.
+
+    :param keys: The keys of the lists.
+    :param document: The document.
+    :param dropped: Dict of the IDs of replaced objects to the objects.
+
+    :return: None
+    """
+    for key in keys:
+        values = document[key] if key in document else None
+        if type(values) is list:
+            for index, value in enumerate(values):
+                if type(value) is str:
+                    values[index] = _intern(value, dropped)
+
+
+def serialize(obj):
+    """Turn a record back into a dict for json.dumps(). Pass this as the default argument.
+
+    :param obj: The object json.dumps() couldn't serialize.
+
+    :return: Dict of the record's fields.
+    """
+    if isinstance(obj, Record):
+        return {key: obj._raw(key) for key in obj}
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(obj).__name__))
@@ -448,4 +448,12 @@ class Shell:
         if command in self._disabled_commands and not console.user["wizard"]:
             console.msg("{0}: Command disabled.".format(command))
             return False
-        return self._commands[command].COMMAND(console, args)
+
+        # Everything the command changes is written to disk together when it finishes.
+        # Documents it looks up more than once are only fetched the first time, until it finishes.
+        written = self._database.bytes_written()
+        with self._database.transaction(), self._database.cached():
+            result = self._commands[command].COMMAND(console, args)
+        self._log.debug("Command {command} wrote {count} bytes to the database.", command=command,
+                        count=self._database.bytes_written() - written)
+        return result
@@ -0,0 +1,1290 @@
+#######################
+# Dennis MUD          #
+# storage.py          #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This module contains the TinyDB storage backends used by the DatabaseManager.
+
+import collections
+import contextlib
+import gc
+import json
+import os
+import pickle
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+from collections.abc import Mapping, MutableMapping
+from tinydb.storages import Storage
+
+# Compact the journal into a new checkpoint once it grows past this many bytes.
+JOURNAL_LIMIT = 16 * 1024 * 1024
+
+# The layout of snapshot files. Snapshots of any other format are ignored.
+SNAPSHOT_FORMAT = 2
+
+# The pickle protocol used for snapshot files.
+SNAPSHOT_PROTOCOL = 5
+
+# How many characters of the world file to read at a time when loading it.
+LOAD_CHUNK = 4 * 1024 * 1024
+
+# How many rows of an SQLite table to load at a time.
+LOAD_ROWS = 10000
+
+# The tables the paged engine splits into shards, how many document IDs each shard covers by default, and how many
+# bytes of shards it keeps loaded by default.
+PAGED_TABLES = ["rooms", "items", "users"]
+PAGE_SHARD_SIZE = 1000
+PAGE_BUDGET = 64 * 1024 * 1024
+
+# Matches the gap between two documents in a table of a world file. It can also match inside a document, if the
+# document has a dict with numeric keys, so every match must be checked.
+_DOCUMENT_GAP = re.compile(r'\}\s*,\s*"\d+"\s*:\s*\{')
+
+# Columns copied out of each document into the SQLite engine's tables, so that they can be indexed.
+# Every table also has a doc_id primary key and a doc column holding the JSON document.
+SQLITE_COLUMNS = {
+    "rooms": ["id"],
+    "items": ["id"],
+    "users": ["name", "nick"]
+}
+
+# Indexes for the SQLite engine. User names and nicknames are looked up case-insensitively.
+SQLITE_INDEXES = {
+    "rooms": {"id": "id"},
+    "items": {"id": "id"},
+    "users": {"name": "lower(name)", "nick": "lower(nick)"}
+}
+
+
+class ResidentStorage(Storage):
+    """Resident JSON Storage
+
+    TinyDB's default JSONStorage reads and parses the entire world file every time a table is searched.
+    This storage loads the world file into memory once, and serves every read from memory afterwards.
+    The world file is only touched when something is written.
+
+    The data returned by read() is the live in-memory world, not a copy, so it must not be modified
+    except through TinyDB or the DatabaseManager.
+
+    If deferred is set, writes only update the in-memory world, and the world file is not written
+    until flush() is called. The DatabaseManager uses this for write-behind persistence.
+
+    Subclasses that write single documents can use _diff() to write only the fields that changed since a document
+    was last persisted. To do this, the serialized fields of each document written since the last full write are
+    kept in memory.
+
+    If snapshot is set, a binary snapshot of the world is written next to the world file as <world>.snapshot on a
+    clean shutdown, and loaded instead of parsing the world file on the next startup, which is much faster. The
+    snapshot is tagged with the given version and the size and modification time of the world file it was taken
+    from, and is ignored if any of them don't match, or if it can't be read. Snapshots are pickles, so they must only
+    be loaded from trusted locations, just like the world file itself.
+
+    The world file is loaded a piece at a time, so that peak memory use stays close to the size of the loaded world,
+    rather than holding the whole file text and the whole parsed world at once. If load_hook is set, it is called
+    with the name of a table and each batch of its documents as they are loaded, and may replace the documents in the
+    batch with more compact objects before the next batch is loaded.
+
+    :ivar deferred: Whether writes are held in memory until the next flush().
+    :ivar pending: Whether there are deferred writes that have not been flushed yet.
+    :ivar field_diffs: Whether to write only the changed fields of documents, if the storage supports it.
+    :ivar bytes_written: The total number of bytes written to disk so far.
+    :ivar loaded_from: Where the world was loaded from: "json", "snapshot", or "sqlite".
+    :ivar load_times: Dict of table names to the seconds taken to load them. The key None holds the time taken to
+        parse a whole world file whose tables can't be timed separately.
+    :ivar snapshot_error: Why the snapshot couldn't be used on startup, or None if it was used or there was none.
+    """
+    def __init__(self, path, encoding=None, snapshot=None, load_hook=None, **kwargs):
+        """Resident Storage Initializer
+
+        :param path: The relative or absolute filename of the JSON world file.
+        :param encoding: The file encoding to use, if not the system default.
+        :param snapshot: The version to tag binary snapshots with, or None to not use snapshots.
+        :param load_hook: Function to call with each table name and batch of documents dict as they are loaded.
+        :param kwargs: Extra keyword arguments to pass to json.dumps() when writing.
+        """
+        super().__init__()
+
+        self.kwargs = kwargs
+        self.deferred = False
+        self.pending = False
+        self.field_diffs = True
+        self.bytes_written = 0
+        self.loaded_from = None
+        self.load_times = {}
+        self.snapshot_error = None
+
+        self._path = path
+        self._encoding = encoding
+        self._snapshot = snapshot
+        self._snapshotpath = path + ".snapshot"
+        self._load_hook = load_hook
+        self._persisted = {}
+
+        # Load the world into memory.
+        self._data = self._load()
+
+    def read(self):
+        """Read the world from memory.
+
+        :return: The in-memory world dict, or None if the world is empty.
+        """
+        return self._data
+
+    def write(self, data):
+        """Replace the in-memory world and write it through to the world file, unless writes are deferred.
+
+        :param data: The world dict to store.
+
+        :return: None
+        """
+        self._data = data
+        self.pending = True
+        if not self.deferred:
+            self.flush()
+
+    def update(self, table, doc_id, document):
+        """Replace, insert, or remove a single document in the in-memory world, and write it through.
+
+        This is much cheaper than going through TinyDB, which rebuilds the whole table for every write.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document.
+        :param document: The new document, or None to remove the document.
+
+        :return: None
+        """
+        if self._data is None:
+            self._data = {}
+        if table not in self._data:
+            self._data[table] = {}
+        if document is None:
+            self._data[table].pop(str(doc_id), None)
+        else:
+            self._data[table][str(doc_id)] = document
+        self._changed(table, str(doc_id))
+        self.pending = True
+        if not self.deferred:
+            self.flush()
+
+    def flush(self):
+        """Write any deferred changes to the world file.
+
+        :return: True if anything was written, False if there was nothing to write.
+        """
+        if not self.pending:
+            return False
+        self._persist()
+        self.pending = False
+        return True
+
+    def close(self):
+        """Flush any deferred changes, and write a snapshot if we are using them.
+
+        :return: None
+        """
+        self.flush()
+        self._write_snapshot()
+
+    def _changed(self, table, doc_id):
+        """Note that a single document has changed. The whole world is rewritten anyway, so do nothing.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document, as a string.
+
+        :return: None
+        """
+        pass
+
+    def _diff(self, table, doc_id, document):
+        """Find the fields of a document that changed since it was last persisted, and remember it as persisted.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document, as a string.
+        :param document: The document as it is now, or None if it was removed.
+
+        :return: Tuple of a dict of every field name to its serialized value, and a dict of only the changed ones,
+            which is None if the whole document needs to be written.
+        """
+        if document is None:
+            self._persisted.pop((table, doc_id), None)
+            return {}, None
+        fields = {name: json.dumps(document[name], **self.kwargs) for name in document}
+        previous = self._persisted.get((table, doc_id))
+        self._persisted[(table, doc_id)] = fields
+
+        # We haven't written this document since the last full write, or a field was removed.
+        if not self.field_diffs or previous is None or previous.keys() - fields.keys():
+            return fields, None
+        return fields, {name: value for name, value in fields.items() if previous.get(name) != value}
+
+    def _load(self):
+        """Load the world from its snapshot if possible, or else from the world file.
+
+        :return: The world dict, or None if the world is empty.
+        """
+        with paused_gc():
+            return self._load_world()
+
+    def _load_world(self):
+        """Load the world from its snapshot if possible, or else from the world file.
+
+        :return: The world dict, or None if the world is empty.
+        """
+        # Create the file if it doesn't exist.
+        with open(self._path, "a", encoding=self._encoding):
+            pass
+
+        # Try the snapshot first.
+        if self._snapshot is not None and os.path.exists(self._snapshotpath):
+            try:
+                data = self._read_snapshot()
+                self.loaded_from = "snapshot"
+                return data
+            except Exception as e:
+                self.snapshot_error = str(e) or type(e).__name__
+                self.load_times = {}
+
+        # An empty file means a new world.
+        self.loaded_from = "json"
+        with open(self._path, "r", encoding=self._encoding) as f:
+            f.seek(0, os.SEEK_END)
+            if not f.tell():
+                return None
+            f.seek(0)
+            return self._stream(_ChunkReader(f))
+
+    def _stream(self, reader):
+        """Load a world file one table at a time, and each table a batch of documents at a time.
+
+        :param reader: The _ChunkReader for the world file.
+
+        :return: The world dict.
+        """
+        data = {}
+        reader.expect("{")
+        while reader.peek() != "}":
+            if data:
+                reader.expect(",")
+            start = time.perf_counter()
+            table = reader.decode()
+            reader.expect(":")
+
+            # Anything that isn't a table of documents is loaded in one piece.
+            if reader.peek() != "{":
+                data[table] = reader.decode()
+                continue
+            reader.expect("{")
+            data[table] = {}
+            for batch in reader.documents():
+                if self._load_hook:
+                    self._load_hook(table, batch)
+                data[table].update(batch)
+            self.load_times[table] = time.perf_counter() - start
+        reader.expect("}")
+        return data
+
+    def _snapshot_tag(self):
+        """Make the tag that identifies the world file a snapshot was taken from.
+
+        :return: The tag dict.
+        """
+        stat = os.stat(self._path)
+        return {"format": SNAPSHOT_FORMAT, "version": self._snapshot, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def _read_snapshot(self):
+        """Load the world from its snapshot, timing each table.
+
+        The snapshot holds a pickled tag, then a pickled (table name, documents) tuple for each table, then None.
+        Each of them is pickled on its own. Anything that doesn't have that shape raises ValueError.
+
+        :return: The world dict, or None if the world is empty.
+        """
+        with open(self._snapshotpath, "rb") as f:
+            if pickle.load(f) != self._snapshot_tag():
+                raise ValueError("stale snapshot")
+            data = {}
+            while True:
+                start = time.perf_counter()
+                entry = pickle.load(f)
+                if entry is None:
+                    if data and not any("version" in info for info in data.get("_info", {}).values()):
+                        raise ValueError("corrupt snapshot: no version in _info")
+                    return data or None
+                _check_snapshot_entry(entry)
+                if self._load_hook and type(entry[1]) is dict:
+                    self._load_hook(entry[0], entry[1])
+                data[entry[0]] = entry[1]
+                self.load_times[entry[0]] = time.perf_counter() - start
+
+    def _write_snapshot(self):
+        """Write a snapshot of the in-memory world, which must already be persisted to the world file.
+
+        :return: None
+        """
+        if self._snapshot is None:
+            return
+        with open(self._snapshotpath + ".tmp", "wb") as f:
+            pickler = _SnapshotPickler(f, self.kwargs.get("default"))
+            pickler.dump(self._snapshot_tag())
+            pickler.clear_memo()
+            for table, documents in (self._data or {}).items():
+                pickler.dump((table, documents))
+                pickler.clear_memo()
+            pickler.dump(None)
+        os.replace(self._snapshotpath + ".tmp", self._snapshotpath)
+
+    def _persist(self):
+        """Serialize the in-memory world to the world file.
+
+        The world is written to a temporary file which then replaces the world file, so that a crash during the write
+        leaves the previous world file intact.
+
+        :return: None
+        """
+        serialized = json.dumps(self._data, **self.kwargs)
+        _write_file(self._path, serialized, self._encoding)
+        self.bytes_written += len(serialized)
+
+
+class _ChunkReader:
+    """Reads a JSON world file a chunk at a time, for ResidentStorage._stream().
+
+    Only the unread part of the current chunk is kept in memory. Documents are parsed many at a time, by cutting the
+    text at the last gap between documents in the chunk, so that they share their key strings like they would if the
+    whole file were parsed at once.
+    """
+    def __init__(self, f):
+        """Chunk Reader Initializer
+
+        :param f: The world file, opened for reading text.
+        """
+        self._file = f
+        self._decoder = json.JSONDecoder()
+        self._text = ""
+        self._pos = 0
+        self._eof = False
+
+    def peek(self):
+        """Skip whitespace, and look at the next character.
+
+        :return: The next character, or "" at the end of the file.
+        """
+        while True:
+            while self._pos < len(self._text) and self._text[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._text) or self._eof:
+                return self._text[self._pos:self._pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        """Skip whitespace, and then a character that must be next.
+
+        :param char: The character.
+
+        :return: None
+        """
+        if self.peek() != char:
+            raise json.JSONDecodeError("Expecting '{0}'".format(char), self._text, self._pos)
+        self._pos += 1
+
+    def decode(self):
+        """Parse the next JSON value.
+
+        :return: The value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._text, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+
+            # A number at the end of the chunk might go on in the next one.
+            if end < len(self._text) or self._eof:
+                self._pos = end
+                return value
+            self._fill()
+
+    def documents(self):
+        """Parse the documents of a table, after its opening brace has been read, up to and including its closing
+        brace.
+
+        :return: Iterator of dicts of document IDs to documents.
+        """
+        while self.peek() != "}":
+            if self._text[self._pos] == ",":
+                self._pos += 1
+            batch = self._batch()
+            if batch is None:
+                self._fill()
+                continue
+            batch, closed = batch
+            yield batch
+            if closed:
+                return
+        self._pos += 1
+
+    def _batch(self):
+        """Parse as many whole documents as the current chunk holds.
+
+        :return: Tuple of a dict of document IDs to documents and whether the end of the table was reached, or None if
+            the chunk doesn't hold a whole document.
+        """
+        # Try cutting at the last few gaps between documents in the chunk.
+        gaps = [match.start() + 1 for match in _DOCUMENT_GAP.finditer(self._text, self._pos)]
+        for cut in reversed(gaps[-3:]):
+            text = "{" + self._text[self._pos:cut] + "}"
+            try:
+                batch, end = self._decoder.raw_decode(text)
+            except json.JSONDecodeError:
+                continue
+
+            # Either we parsed up to the cut, or the table ended before it.
+            closed = end < len(text)
+            self._pos += end - 1 if closed else end - 2
+            return batch, closed
+
+        # At the end of the file, the rest of the table must be here.
+        if self._eof:
+            batch, end = self._decoder.raw_decode("{" + self._text[self._pos:])
+            self._pos += end - 1
+            return batch, True
+        return None
+
+    def _fill(self):
+        """Read the next chunk, dropping the text that was already parsed.
+
+        :return: None
+        """
+        chunk = self._file.read(LOAD_CHUNK)
+        self._text = self._text[self._pos:] + chunk
+        self._pos = 0
+        self._eof = not chunk
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """Pause the cyclic garbage collector.
+
+    Loading a world creates millions of containers, which would set off the collector over and over for nothing.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """Pickler for snapshots, which writes documents held in other mapping types, like records, as plain dicts."""
+    def __init__(self, file, default=None):
+        """Snapshot Pickler Initializer
+
+        :param file: The file to write to.
+        :param default: Function turning other mapping types into dicts, like the default argument of json.dumps().
+        """
+        super().__init__(file, protocol=SNAPSHOT_PROTOCOL)
+        self._default = default or dict
+
+    def reducer_override(self, obj):
+        if isinstance(obj, Mapping) and type(obj) is not dict:
+            return dict, (self._default(obj),)
+        return NotImplemented
+
+
+def _check_snapshot_entry(entry):
+    """Make sure a table read from a snapshot has the shape of a table, so that a corrupt snapshot isn't loaded.
+
+    :param entry: The (table name, documents) tuple read from the snapshot.
+
+    :return: None
+    """
+    if type(entry) is not tuple or len(entry) != 2 or type(entry[0]) is not str:
+        raise ValueError("corrupt snapshot: bad table entry")
+    if type(entry[1]) is not dict:
+        return
+    for doc_id, document in entry[1].items():
+        if type(doc_id) is not str or not doc_id.isdigit() or not isinstance(document, Mapping):
+            raise ValueError("corrupt snapshot: bad document in table {0}".format(entry[0]))
+
+
+def _write_file(path, serialized, encoding=None):
+    """Write a file through a temporary file which then replaces it, so that a crash leaves the old file intact.
+
+    :param path: The filename.
+    :param serialized: The text to write.
+    :param encoding: The file encoding to use, if not the system default.
+
+    :return: None
+    """
+    with open(path + ".tmp", "w", encoding=encoding) as f:
+        f.write(serialized)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def _join(fields):
+    """Join serialized fields into a serialized JSON object.
+
+    :param fields: Dict of field names to serialized values.
+
+    :return: The serialized object.
+    """
+    return "{" + ", ".join("{0}: {1}".format(json.dumps(name), value) for name, value in fields.items()) + "}"
+
+
+class JournalStorage(ResidentStorage):
+    """Journal Storage
+
+    Like ResidentStorage, the world is kept in memory. But instead of rewriting the whole world file on every change,
+    the documents changed since the last flush are appended as one record to a journal file next to the world file.
+    The world file itself is the last checkpoint, so write cost is proportional to the change rather than to the size
+    of the world.
+
+    On startup the journal is replayed on top of the checkpoint. A torn record at the end of the journal, left by a
+    crash in the middle of a write, is discarded. Since each record holds everything from one flush, a flush is
+    either replayed completely or not at all. Documents that were already journaled since the last checkpoint are
+    journaled as only the fields that changed. Once the journal passes journal_limit bytes, the world is compacted
+    into a new checkpoint and the journal starts over. The checkpoint is written by a background thread, while new
+    records go to a fresh journal. The previous journal is kept as <world>.journal.old until the checkpoint is safely
+    in place, and is replayed first if we crash before that.
+
+    A clean shutdown always leaves a fully compacted world file, so backups and the dbupdater scripts work unchanged.
+
+    :ivar journal_limit: The journal size in bytes after which a new checkpoint is made.
+    :ivar replayed: The number of changed documents that were replayed from the journal on startup.
+    :ivar discarded: The size of the torn journal records that were discarded on startup.
+    """
+    def __init__(self, path, encoding=None, journal_limit=JOURNAL_LIMIT, **kwargs):
+        """Journal Storage Initializer
+
+        :param path: The relative or absolute filename of the JSON world file, which holds the last checkpoint.
+        :param encoding: The file encoding to use, if not the system default.
+        :param journal_limit: The journal size in bytes after which a new checkpoint is made.
+        :param kwargs: Extra keyword arguments to pass to json.dumps() when writing.
+        """
+        super().__init__(path, encoding, **kwargs)
+
+        self.journal_limit = journal_limit
+        self.replayed = 0
+        self.discarded = 0
+
+        self._journalpath = path + ".journal"
+        self._oldjournalpath = path + ".journal.old"
+        self._changes = set()
+        self._checkpoint_needed = False
+        self._compactor = None
+
+        # Replay the journal left over from an unfinished compaction first, then the current journal.
+        for journalpath in [self._oldjournalpath, self._journalpath]:
+            if os.path.exists(journalpath):
+                self._replay(journalpath)
+        self._journal = open(self._journalpath, "a", encoding=encoding)
+
+        # If we replayed anything, fold it into a fresh checkpoint right away.
+        if self.replayed or self.discarded or os.path.exists(self._oldjournalpath):
+            self._compact(background=False)
+
+    def write(self, data):
+        """Replace the in-memory world. Since we don't know what changed, the next flush makes a new checkpoint.
+
+        :param data: The world dict to store.
+
+        :return: None
+        """
+        self._checkpoint_needed = True
+        super().write(data)
+
+    def close(self):
+        """Flush any deferred changes, compact the world into a final checkpoint, and write a snapshot of it if we are
+        using them.
+
+        :return: None
+        """
+        self.flush()
+        self._compact(background=False)
+        self._journal.close()
+        self._write_snapshot()
+
+    def _changed(self, table, doc_id):
+        """Remember that a single document has changed, so that it is journaled on the next flush.
+
+        Several changes to the same document between flushes are journaled only once.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document, as a string.
+
+        :return: None
+        """
+        self._changes.add((table, doc_id))
+
+    def _persist(self):
+        """Append the changed documents to the journal, or make a new checkpoint if needed.
+
+        :return: None
+        """
+        # Something was written through TinyDB directly, so we can't journal it. Checkpoint the whole world.
+        if self._checkpoint_needed:
+            self._compact()
+            return
+
+        # Append a single record holding each changed document as it is now, or None if it was removed.
+        # If we journaled the document before, only hold the fields that changed.
+        changes = []
+        for table, doc_id in self._changes:
+            fields, diff = self._diff(table, doc_id, self._data.get(table, {}).get(doc_id))
+            if diff is None:
+                change = _join(fields) if fields else "null"
+                key = "doc"
+            elif diff:
+                change = _join(diff)
+                key = "fields"
+            else:
+                continue
+            changes.append('{{"table": {0}, "doc_id": {1}, "{2}": {3}}}'.format(
+                json.dumps(table), json.dumps(doc_id), key, change))
+        self._changes.clear()
+        if not changes:
+            return
+        record = '{"changes": [' + ", ".join(changes) + ']}\n'
+        self._journal.write(record)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.bytes_written += len(record)
+
+        # The journal has grown too large, so compact it.
+        if self._journal.tell() > self.journal_limit:
+            self._compact()
+
+    def _replay(self, journalpath):
+        """Replay the records of a journal file on top of the in-memory world.
+
+        :param journalpath: The filename of the journal to replay.
+
+        :return: None
+        """
+        if self._data is None:
+            self._data = {}
+        with open(journalpath, "r", encoding=self._encoding) as f:
+            for line in f:
+                # Stop at a torn record. Nothing after it can be trusted.
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("Incomplete journal record")
+                    record = json.loads(line)
+                except ValueError:
+                    self.discarded += len(line) + sum(len(rest) for rest in f)
+                    return
+
+                # Older journals have one record per changed document.
+                for change in record["changes"] if "changes" in record else [record]:
+                    if change["table"] not in self._data:
+                        self._data[change["table"]] = {}
+                    if "fields" in change:
+                        if change["doc_id"] in self._data[change["table"]]:
+                            self._data[change["table"]][change["doc_id"]].update(change["fields"])
+                    elif change["doc"] is None:
+                        self._data[change["table"]].pop(change["doc_id"], None)
+                    else:
+                        self._data[change["table"]][change["doc_id"]] = change["doc"]
+                    self.replayed += 1
+
+    def _compact(self, background=True):
+        """Write the whole in-memory world as a new checkpoint, and start a new journal.
+
+        :param background: Whether to write the checkpoint from a background thread.
+
+        :return: None
+        """
+        # Only one compaction can run at a time.
+        if self._compactor:
+            self._compactor.join()
+            self._compactor = None
+
+        # Take the snapshot and start a new journal for everything that happens after it.
+        # If an earlier compaction failed, its old journal is still needed, so add this journal to it.
+        serialized = json.dumps(self._data, **self.kwargs)
+        self._journal.close()
+        if os.path.exists(self._oldjournalpath):
+            with open(self._journalpath, "r", encoding=self._encoding) as src, \
+                    open(self._oldjournalpath, "a", encoding=self._encoding) as dst:
+                dst.write(src.read())
+            os.remove(self._journalpath)
+        else:
+            os.replace(self._journalpath, self._oldjournalpath)
+        self._journal = open(self._journalpath, "a", encoding=self._encoding)
+        self._changes.clear()
+        self._persisted.clear()
+        self._checkpoint_needed = False
+
+        # Write the checkpoint, then forget the old journal.
+        if background:
+            self._compactor = threading.Thread(target=self._checkpoint, args=(serialized,), daemon=True)
+            self._compactor.start()
+        else:
+            self._checkpoint(serialized)
+
+    def _checkpoint(self, serialized):
+        """Atomically replace the world file with a new checkpoint, and remove the old journal.
+
+        :param serialized: The serialized world.
+
+        :return: None
+        """
+        with open(self._path + ".tmp", "w", encoding=self._encoding) as f:
+            f.write(serialized)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self._path + ".tmp", self._path)
+        os.remove(self._oldjournalpath)
+        self.bytes_written += len(serialized)
+
+
+class SQLiteStorage(ResidentStorage):
+    """SQLite Storage
+
+    Like ResidentStorage, the world is kept in memory. But it is stored in an SQLite database with one table each
+    for rooms, items, users, and _info, instead of in a JSON file. Each document is a row holding the JSON document,
+    along with copies of its room or item ID, or its user name and nickname, which are indexed.
+
+    Changed documents are written as individual rows, so write cost is proportional to the change rather than to
+    the size of the world. Rows that were already written since the database was opened are updated in place with
+    only the fields that changed. Everything changed between flushes is written in a single transaction, and the
+    database uses SQLite's own write-ahead log.
+
+    Use util/dbconvert.py to convert an existing JSON world.
+    """
+    def __init__(self, path, **kwargs):
+        """SQLite Storage Initializer
+
+        :param path: The relative or absolute filename of the SQLite database file.
+        :param kwargs: Extra keyword arguments to pass to json.dumps() when writing documents.
+        """
+        self._connection = None
+        self._tables = set()
+        self._changes = set()
+        self._rewrite_needed = False
+
+        super().__init__(path, **kwargs)
+
+    def write(self, data):
+        """Replace the in-memory world. Since we don't know what changed, the next flush rewrites every table.
+
+        :param data: The world dict to store.
+
+        :return: None
+        """
+        self._rewrite_needed = True
+        super().write(data)
+
+    def close(self):
+        """Flush any deferred changes and close the database.
+
+        :return: None
+        """
+        self.flush()
+        self._connection.close()
+
+    def _changed(self, table, doc_id):
+        """Remember that a single document has changed, so that its row is written on the next flush.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document, as a string.
+
+        :return: None
+        """
+        self._changes.add((table, doc_id))
+
+    def _load(self):
+        """Open the database, creating the tables and indexes if needed, and load the world.
+
+        :return: The world dict, or None if the world is empty.
+        """
+        self._connection = sqlite3.connect(self._path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        for table in ["_info"] + list(SQLITE_COLUMNS.keys()):
+            self._create_table(table)
+        self._connection.commit()
+
+        # Load every table in the database, including any that TinyDB made on its own.
+        # The documents are parsed many at a time, so that they share the same key strings.
+        self.loaded_from = "sqlite"
+        data = {}
+        with paused_gc():
+            for (table,) in self._connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall():
+                start = time.perf_counter()
+                self._tables.add(table)
+                cursor = self._connection.execute('SELECT doc_id, doc FROM "{0}"'.format(table))
+                while True:
+                    rows = cursor.fetchmany(LOAD_ROWS)
+                    if not rows:
+                        break
+                    docs = json.loads("[" + ", ".join(doc for doc_id, doc in rows) + "]")
+                    batch = {str(row[0]): doc for row, doc in zip(rows, docs)}
+                    if self._load_hook:
+                        self._load_hook(table, batch)
+                    data.setdefault(table, {}).update(batch)
+                self.load_times[table] = time.perf_counter() - start
+        return data or None
+
+    def _create_table(self, table):
+        """Create a table and its indexes if they don't exist yet.
+
+        :param table: The name of the table.
+
+        :return: None
+        """
+        if table in self._tables:
+            return
+        columns = ''.join(", {0}".format(column) for column in SQLITE_COLUMNS.get(table, []))
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS "{0}" (doc_id INTEGER PRIMARY KEY{1}, doc TEXT NOT NULL)'.format(
+                table, columns))
+        for name, expression in SQLITE_INDEXES.get(table, {}).items():
+            self._connection.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ({2})'.format(
+                table, name, expression))
+        self._tables.add(table)
+
+    def _write_row(self, table, doc_id):
+        """Write the row for a single document as it is now, or delete the row if the document was removed.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document.
+
+        :return: None
+        """
+        document = (self._data or {}).get(table, {}).get(str(doc_id))
+        fields, diff = self._diff(table, str(doc_id), document)
+        if document is None:
+            self._connection.execute('DELETE FROM "{0}" WHERE doc_id = ?'.format(table), (int(doc_id),))
+            return
+        columns = SQLITE_COLUMNS.get(table, [])
+
+        # Write the whole row.
+        if diff is None:
+            serialized = _join(fields)
+            self._connection.execute('INSERT OR REPLACE INTO "{0}" (doc_id, {1}doc) VALUES (?, {2}?)'.format(
+                table, ''.join("{0}, ".format(column) for column in columns), "?, " * len(columns)),
+                [int(doc_id)] + [document.get(column) for column in columns] + [serialized])
+            self.bytes_written += len(serialized)
+
+        # Only set the fields that changed in the stored document, along with any indexed columns.
+        elif diff:
+            changed = [column for column in columns if column in diff]
+            self._connection.execute('UPDATE "{0}" SET {1}doc = json_set(doc{2}) WHERE doc_id = ?'.format(
+                table, ''.join("{0} = ?, ".format(column) for column in changed), ", ?, json(?)" * len(diff)),
+                [document[column] for column in changed] +
+                [value for name in diff for value in ('$."{0}"'.format(name), diff[name])] + [int(doc_id)])
+            self.bytes_written += sum(len(name) + len(value) for name, value in diff.items())
+
+    def _persist(self):
+        """Write every changed document in a single transaction, or rewrite every table if needed.
+
+        :return: None
+        """
+        with self._connection:
+            # Something was written through TinyDB directly, so we don't know what changed. Rewrite everything.
+            if self._rewrite_needed:
+                self._persisted.clear()
+                for table in self._data or {}:
+                    self._create_table(table)
+                    self._connection.execute('DELETE FROM "{0}"'.format(table))
+                    for doc_id in self._data[table]:
+                        self._write_row(table, doc_id)
+
+            # Otherwise just write the rows that changed.
+            else:
+                for table, doc_id in self._changes:
+                    self._create_table(table)
+                    self._write_row(table, doc_id)
+
+        self._changes.clear()
+        self._rewrite_needed = False
+
+
+class PagedStorage(ResidentStorage):
+    """Paged Storage
+
+    For worlds too big to keep in memory. Rooms, items, and users are split into shard files by document ID range,
+    kept in a <world>.shards directory next to the world file, which holds everything else. A shard is only loaded
+    the first time one of its documents is read or written, and the least recently used shards are dropped from memory
+    again once the loaded shards take more than the memory budget, measured by their size on disk. Shards with
+    unflushed changes are written back to disk before they are dropped, even if writes are deferred, so the world is
+    no longer written in one piece. Since room and item IDs are given out in order, so are their document IDs, and
+    rooms and items that are near each other by ID usually share a shard.
+
+    The document IDs in each shard are kept in memory and in <world>.shards/keys.json, so that tables can be counted
+    and iterated without loading every shard. Iterating over the items of a table loads one shard at a time. Binary
+    snapshots aren't supported, since the whole world is never in memory at once.
+
+    Setting an existing world's engine to paged moves its rooms, items, and users into shards on the next startup.
+
+    :ivar budget: How many bytes of shards to keep loaded, or 0 for no limit.
+    :ivar shard_size: How many document IDs each shard covers.
+    :ivar frozen: If set, nothing is written, and shards with unflushed changes are never dropped. See freeze().
+    :ivar hits: How many times a document was read or written in a shard that was already loaded.
+    :ivar misses: How many times a shard had to be loaded.
+    :ivar evictions: How many times a shard was dropped from memory.
+    """
+    def __init__(self, path, budget=PAGE_BUDGET, shard_size=PAGE_SHARD_SIZE, snapshot=None, **kwargs):
+        """Paged Storage Initializer
+
+        :param path: The relative or absolute filename of the JSON world file.
+        :param budget: How many bytes of shards to keep loaded, or 0 for no limit.
+        :param shard_size: How many document IDs each shard covers.
+        :param snapshot: Ignored, since snapshots aren't supported.
+        :param kwargs: Extra keyword arguments to pass to the ResidentStorage initializer.
+        """
+        self.budget = budget
+        self.shard_size = shard_size
+        self.frozen = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._shardpath = path + ".shards"
+        self._keys = {table: {} for table in PAGED_TABLES}
+        self._tables = {table: _PagedTable(self, table) for table in PAGED_TABLES}
+        self._loaded = collections.OrderedDict()
+        self._sizes = {}
+        self._dirty = set()
+        self._keys_changed = False
+        self._rest_changed = False
+
+        super().__init__(path, **kwargs)
+
+    def write(self, data):
+        """Replace the in-memory world and write it through to disk, unless writes are deferred.
+
+        TinyDB hands back paged tables as plain dicts when it writes a whole table, so they are moved into shards.
+
+        :param data: The world dict to store.
+
+        :return: None
+        """
+        for table in PAGED_TABLES:
+            if table in data and type(data[table]) is dict:
+                self._replace_table(table, data[table])
+                data[table] = self._tables[table]
+        self._rest_changed = True
+        super().write(data)
+
+    def pin(self, directory):
+        """Hardlink every shard file as it is now into a new directory, or copy it if hardlinks aren't supported.
+
+        Shard files are always replaced rather than written into, so the links keep this version of them.
+
+        :param directory: The directory to create.
+
+        :return: None
+        """
+        os.makedirs(directory)
+        for name in os.listdir(self._shardpath):
+            if name.endswith(".json"):
+                try:
+                    os.link(os.path.join(self._shardpath, name), os.path.join(directory, name))
+                except (OSError, AttributeError):
+                    shutil.copyfile(os.path.join(self._shardpath, name), os.path.join(directory, name))
+
+    def freeze(self, directory):
+        """Stop writing to disk, and load shards from a directory made by pin() from now on.
+
+        A forked backup does this in the child process, so that it reads the world as it was when it was forked.
+
+        :param directory: The directory made by pin().
+
+        :return: None
+        """
+        self.frozen = True
+        self._shardpath = directory
+
+    def stats(self):
+        """Report how well the memory budget fits the way the world is used.
+
+        :return: Dict of the hits, misses, and evictions so far, and the number and total size of loaded shards.
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "loaded": len(self._loaded),
+                "bytes": sum(self._sizes.values())}
+
+    def _changed(self, table, doc_id):
+        """Note that a single document has changed. Changes to shards are tracked by the shards themselves.
+
+        :param table: The name of the table containing the document.
+        :param doc_id: The TinyDB document ID of the document, as a string.
+
+        :return: None
+        """
+        if table not in self._keys:
+            self._rest_changed = True
+
+    def _load_world(self):
+        """Load everything but the paged tables from the world file, and the document IDs of the shards.
+
+        :return: The world dict.
+        """
+        data = super()._load_world() or {}
+        os.makedirs(self._shardpath, exist_ok=True)
+        keyspath = os.path.join(self._shardpath, "keys.json")
+        if os.path.exists(keyspath):
+            with open(keyspath, "r", encoding=self._encoding) as f:
+                for table, doc_ids in json.load(f).items():
+                    for doc_id in doc_ids:
+                        self._keys[table].setdefault(doc_id // self.shard_size, set()).add(str(doc_id))
+
+        # Trust the shard files over keys.json, which may be behind if we crashed while writing. Shards that keys.json
+        # doesn't know about are loaded to find out what is in them.
+        found = {table: set() for table in PAGED_TABLES}
+        for name in os.listdir(self._shardpath):
+            match = re.match(r"(\w+)-(\d+)\.json$", name)
+            if match and match.group(1) in found:
+                found[match.group(1)].add(int(match.group(2)))
+        for table in PAGED_TABLES:
+            for shard in set(self._keys[table]) - found[table]:
+                self._set_keys(table, shard, set())
+            for shard in sorted(found[table] - set(self._keys[table])):
+                self._shard(table, shard)
+
+        # Move any documents of paged tables still in the world file into shards.
+        moved = False
+        for table in PAGED_TABLES:
+            documents = data.get(table)
+            data[table] = self._tables[table]
+            if documents:
+                self._replace_table(table, documents)
+                moved = True
+        if moved:
+            self._data = data
+            self._rest_changed = True
+            self._persist()
+        return data
+
+    def _shard(self, table, shard):
+        """Get the documents of a shard, loading it if needed.
+
+        :param table: The name of the table.
+        :param shard: The number of the shard.
+
+        :return: Dict of document IDs to documents, which is live until the shard is dropped.
+        """
+        key = (table, shard)
+        if key in self._loaded:
+            self.hits += 1
+            self._loaded.move_to_end(key)
+            return self._loaded[key]
+        self.misses += 1
+
+        # Load the shard, and trust it over keys.json.
+        documents = {}
+        size = 0
+        path = self._shard_path(table, shard)
+        if os.path.exists(path):
+            with open(path, "r", encoding=self._encoding) as f:
+                serialized = f.read()
+            size = len(serialized)
+            documents = json.loads(serialized)
+            if self._load_hook:
+                self._load_hook(table, documents)
+        if set(documents) != self._keys[table].get(shard, set()):
+            self._set_keys(table, shard, set(documents))
+        self._loaded[key] = documents
+        self._sizes[key] = size
+        self._evict()
+        return documents
+
+    def _evict(self):
+        """Drop the least recently used shards until the loaded shards fit the memory budget again.
+
+        The most recently used shard is never dropped.
+
+        :return: None
+        """
+        if not self.budget:
+            return
+        total = sum(self._sizes.values())
+        for key in list(self._loaded)[:-1]:
+            if total <= self.budget:
+                return
+            if key in self._dirty:
+                if self.frozen:
+                    continue
+                self._write_shard(*key)
+            total -= self._sizes.pop(key)
+            del self._loaded[key]
+            self.evictions += 1
+
+    def _set_keys(self, table, shard, doc_ids):
+        """Replace the document IDs known to be in a shard.
+
+        :param table: The name of the table.
+        :param shard: The number of the shard.
+        :param doc_ids: Set of the document IDs in the shard, as strings.
+
+        :return: None
+        """
+        if doc_ids:
+            self._keys[table][shard] = doc_ids
+        else:
+            self._keys[table].pop(shard, None)
+        self._keys_changed = True
+
+    def _replace_table(self, table, documents):
+        """Replace every document in a paged table.
+
+        :param table: The name of the table.
+        :param documents: Dict of document IDs to documents.
+
+        :return: None
+        """
+        paged = self._tables[table]
+        for doc_id in list(paged):
+            if doc_id not in documents:
+                del paged[doc_id]
+        for doc_id in documents:
+            paged[doc_id] = documents[doc_id]
+
+    def _shard_path(self, table, shard):
+        """Make the filename of a shard.
+
+        :param table: The name of the table.
+        :param shard: The number of the shard.
+
+        :return: The filename.
+        """
+        return os.path.join(self._shardpath, "{0}-{1:06d}.json".format(table, shard))
+
+    def _write_shard(self, table, shard):
+        """Write a loaded shard to disk, or remove its file if it is empty.
+
+        :param table: The name of the table.
+        :param shard: The number of the shard.
+
+        :return: None
+        """
+        path = self._shard_path(table, shard)
+        documents = self._loaded[(table, shard)]
+        if documents:
+            serialized = json.dumps(documents, **self.kwargs)
+            _write_file(path, serialized, self._encoding)
+            self._sizes[(table, shard)] = len(serialized)
+            self.bytes_written += len(serialized)
+        elif os.path.exists(path):
+            os.remove(path)
+        self._dirty.discard((table, shard))
+
+    def _persist(self):
+        """Write every changed shard, then the document IDs of the shards, then the rest of the world file.
+
+        :return: None
+        """
+        if self.frozen:
+            return
+        for key in sorted(self._dirty):
+            self._write_shard(*key)
+        if self._keys_changed:
+            serialized = json.dumps({table: sorted(int(doc_id) for shard in self._keys[table].values()
+                                                   for doc_id in shard) for table in self._keys})
+            _write_file(os.path.join(self._shardpath, "keys.json"), serialized, self._encoding)
+            self._keys_changed = False
+        if self._rest_changed:
+            serialized = json.dumps({table: documents for table, documents in (self._data or {}).items()
+                                     if table not in self._keys}, **self.kwargs)
+            _write_file(self._path, serialized, self._encoding)
+            self.bytes_written += len(serialized)
+            self._rest_changed = False
+        self._evict()
+
+    def _write_snapshot(self):
+        """Snapshots aren't supported, so do nothing.
+
+        :return: None
+        """
+        pass
+
+
+class _PagedTable(MutableMapping):
+    """A table of a PagedStorage, which loads its shards as its documents are used."""
+    def __init__(self, storage, table):
+        """Paged Table Initializer
+
+        :param storage: The PagedStorage.
+        :param table: The name of the table.
+        """
+        self._storage = storage
+        self._table = table
+        self._keys = storage._keys[table]
+
+    def __getitem__(self, doc_id):
+        shard = int(doc_id) // self._storage.shard_size
+        if doc_id not in self._keys.get(shard, ()):
+            raise KeyError(doc_id)
+        return self._storage._shard(self._table, shard)[doc_id]
+
+    def __setitem__(self, doc_id, document):
+        shard = int(doc_id) // self._storage.shard_size
+        self._storage._shard(self._table, shard)[doc_id] = document
+        if doc_id not in self._keys.get(shard, ()):
+            self._storage._set_keys(self._table, shard, self._keys.get(shard, set()) | {doc_id})
+        self._storage._dirty.add((self._table, shard))
+
+    def __delitem__(self, doc_id):
+        shard = int(doc_id) // self._storage.shard_size
+        if doc_id not in self._keys.get(shard, ()):
+            raise KeyError(doc_id)
+        del self._storage._shard(self._table, shard)[doc_id]
+        self._storage._set_keys(self._table, shard, self._keys[shard] - {doc_id})
+        self._storage._dirty.add((self._table, shard))
+
+    def __contains__(self, doc_id):
+        return doc_id in self._keys.get(int(doc_id) // self._storage.shard_size, ())
+
+    def __iter__(self):
+        for shard in sorted(self._keys):
+            yield from sorted(self._keys.get(shard, ()), key=int)
+
+    def __len__(self):
+        return sum(len(doc_ids) for doc_ids in self._keys.values())
+
+    def items(self):
+        """Iterate over the documents in order, loading one shard at a time.
+
+        :return: Iterator of tuples of document IDs and documents.
+        """
+        for shard in sorted(self._keys):
+            documents = self._storage._shard(self._table, shard)
+            for doc_id in sorted(documents, key=int):
+                yield doc_id, documents[doc_id]
@@ -34,6 +34,7 @@ if sys.version_info[0] != 3:
     print("Not Starting: Dennis requires Python 3.")
     sys.exit(1)
 
+from lib import backup
 from lib import config as _config
 from lib import console
 from lib import database
@@ -44,13 +45,12 @@ from lib import websocket
 
 import builtins
 import html
-import os
-import shutil
 import signal
 import traceback
 
 from datetime import datetime
-from twisted.internet import reactor, ssl
+from twisted.internet import reactor, ssl, threads
+from twisted.internet.task import LoopingCall, cooperate
 from OpenSSL import crypto as openssl
 
 
@@ -281,24 +281,29 @@ def main():
     logger.init(config)
     log = logger.Logger("server")
 
-    # Rotate database backups, if enabled.
+    # Pin the database file for backup, if enabled. The backups are rotated in the background once we are running.
     # Unfortunately this has to be done before loading the database, because Windows.
-    if os.path.exists(config["database"]["filename"]):
+    backup_pending = False
+    if config["database"]["backups"] and config["database"]["engine"] == "paged":
+        log.warn("Backup rotation is not supported by the paged engine, use backup_interval for online backups.")
+    elif config["database"]["backups"]:
         try:
-            if config["database"]["backups"]:
-                backupnumbers = sorted(range(1, config["database"]["backups"]), reverse=True)
-                for bn in backupnumbers:
-                    if os.path.exists("{0}.bk{1}".format(config["database"]["filename"], bn)):
-                        shutil.copyfile("{0}.bk{1}".format(config["database"]["filename"], bn),
-                                        "{0}.bk{1}".format(config["database"]["filename"], bn + 1))
-                shutil.copyfile(config["database"]["filename"], "{0}.bk1".format(config["database"]["filename"]))
+            backup_pending = backup.pin(config["database"]["filename"], config["database"]["engine"])
         except:
-            log.error("Could not finish rotating backups for database: {file}", file=config["database"]["filename"])
+            log.error("Could not pin database for backup: {file}", file=config["database"]["filename"])
             log.error(traceback.format_exc(1))
 
     # Initialize the Database Manager and load the world database.
     log.info("Initializing database manager...")
-    dbman = database.DatabaseManager(config["database"]["filename"], config.defaults, ignorelockfile=config["ignorelockfile"])
+    dbman = database.DatabaseManager(config["database"]["filename"], config.defaults,
+                                     ignorelockfile=config["ignorelockfile"],
+                                     write_behind=config["database"]["flush_interval"] > 0,
+                                     flush_threshold=config["database"]["flush_threshold"],
+                                     engine=config["database"]["engine"],
+                                     records=config["database"]["records"],
+                                     snapshot=config["database"]["snapshot"],
+                                     page_budget=config["database"]["page_budget"],
+                                     shard_size=config["database"]["shard_size"])
     _dbres = dbman._startup()
     if not _dbres:
         # On failure, only remove the lockfile if its existence wasn't the cause.
@@ -321,6 +326,65 @@ def main():
         return 4
     log.info("Finished initializing services.")
 
+    # Rotate database backups in a background thread, once the reactor is running.
+    if backup_pending:
+        def backup_done(made):
+            if made:
+                log.info("Finished rotating backups for database: {file}", file=config["database"]["filename"])
+            else:
+                log.info("Database unchanged since the last backup, not rotating backups: {file}",
+                         file=config["database"]["filename"])
+
+        def backup_failed(failure):
+            log.error("Could not finish rotating backups for database: {file}", file=config["database"]["filename"])
+            log.error(failure.getTraceback())
+
+        reactor.callWhenRunning(lambda: threads.deferToThread(
+            backup.rotate, config["database"]["filename"], config["database"]["backups"],
+            config["database"]["engine"]).addCallbacks(backup_done, backup_failed))
+
+    # Set up online backups. Wizards can take one any time with the snapshot command. Nothing is created or tracked
+    # until the first backup is taken, so this costs nothing if backups are never taken.
+    snapshotter = backup.Snapshotter(dbman, full_every=config["database"]["backup_full_every"],
+                                     keep=config["database"]["backup_keep"])
+    snapshotter.call_from_thread = reactor.callFromThread
+    dbman.snapshotter = snapshotter
+
+    # Periodically take online backups, if enabled. Documents are serialized a chunk at a time between other work,
+    # then compressed and written in a background thread. If backup_fork is set, bases are taken by a forked child
+    # process instead, without pausing the game. A backup is skipped if the last one is still running.
+    if config["database"]["backup_interval"] > 0:
+        def snapshot_done(path):
+            log.info("Finished online backup of database: {file}", file=path)
+
+        def snapshot_failed(failure):
+            snapshotter.running = False
+            log.error("Could not finish online backup of database: {file}", file=config["database"]["filename"])
+            log.error(failure.getTraceback())
+
+        def fork_done(path, error):
+            if path:
+                log.info("Finished online backup of database: {file}", file=path)
+            else:
+                log.error("Could not finish online backup of database: {file}", file=config["database"]["filename"])
+                log.error(error)
+
+        def take_snapshot():
+            if snapshotter.running:
+                return
+            if config["database"]["backup_fork"] and backup.FORK and snapshotter.full_due():
+                snapshotter.fork(done=fork_done)
+                return
+            cooperate(snapshotter.take()).whenDone().addCallback(
+                lambda _: threads.deferToThread(snapshotter.write)).addCallbacks(snapshot_done, snapshot_failed)
+
+        LoopingCall(take_snapshot).start(config["database"]["backup_interval"], now=False)
+
+    # In write-behind mode, periodically flush changes held in memory to disk.
+    # Anything left over is flushed by dbman._unlock() at shutdown.
+    if config["database"]["flush_interval"] > 0:
+        LoopingCall(dbman.flush).start(config["database"]["flush_interval"], now=False)
+
     # Graceful shutdown on SIGINT (ctrl-c).
     # The shutdown command does the same thing.
     # To shut down quickly but cleanly, send the TERM signal.
@@ -34,6 +34,7 @@ if sys.version_info[0] != 3:
     print("Not Starting: Dennis requires Python 3")
     sys.exit(1)
 
+from lib import backup
 from lib import config as _config
 from lib import logger
 from lib import console as _console
@@ -41,9 +42,8 @@ from lib import database as _database
 from lib import shell as _shell
 
 import builtins
-import os
 import pdb
-import shutil
+import threading
 import traceback
 
 from prompt_toolkit import prompt
@@ -89,24 +89,26 @@ def main():
     logger.init(config)
     log = logger.Logger("singleuser")
 
-    # Rotate database backups, if enabled.
+    # Pin the database file for backup, if enabled. The backups are rotated in the background once we are running.
     # Unfortunately this has to be done before loading the database, because Windows.
-    if os.path.exists(config["database"]["filename"]):
+    backup_pending = False
+    if config["database"]["backups"] and config["database"]["engine"] == "paged":
+        log.warn("Backup rotation is not supported by the paged engine.")
+    elif config["database"]["backups"]:
         try:
-            if config["database"]["backups"]:
-                backupnumbers = sorted(range(1, config["database"]["backups"]), reverse=True)
-                for bn in backupnumbers:
-                    if os.path.exists("{0}.bk{1}".format(config["database"]["filename"], bn)):
-                        shutil.copyfile("{0}.bk{1}".format(config["database"]["filename"], bn),
-                                        "{0}.bk{1}".format(config["database"]["filename"], bn + 1))
-                shutil.copyfile(config["database"]["filename"], "{0}.bk1".format(config["database"]["filename"]))
+            backup_pending = backup.pin(config["database"]["filename"], config["database"]["engine"])
         except:
-            log.error("Could not finish rotating backups for database: {0}".format(config["database"]["filename"]))
+            log.error("Could not pin database for backup: {0}".format(config["database"]["filename"]))
             log.error(traceback.format_exc(1))
 
     # Initialize the database manager, and create the "database" alias for use in Debug Mode.
     log.info("Initializing database manager...")
-    dbman = _database.DatabaseManager(config["database"]["filename"], config.defaults, ignorelockfile=config["ignorelockfile"])
+    dbman = _database.DatabaseManager(config["database"]["filename"], config.defaults,
+                                      ignorelockfile=config["ignorelockfile"], engine=config["database"]["engine"],
+                                      records=config["database"]["records"],
+                                      snapshot=config["database"]["snapshot"],
+                                      page_budget=config["database"]["page_budget"],
+                                      shard_size=config["database"]["shard_size"])
     if not dbman._startup():
         return 3
     log.info("Finished initializing database manager.")
@@ -124,7 +126,7 @@ def main():
     # Create the "console" alias for use in Debug Mode. Also add us to the current room.
     dennis = _console.Console(router, command_shell, "<world>", dbman, log)
     dennis.user = dbman.user_by_name("<world>")
-    dbman._users_online.append("<world>")
+    dbman._users_online.add("<world>")
     thisroom = dbman.room_by_id(dennis.user["room"])
     if thisroom and "<world>" not in thisroom["users"]:
         thisroom["users"].append("<world>")
@@ -137,6 +139,20 @@ def main():
     # Register our console with the router.
     router.users["<world>"] = {"service": "singleuser", "console": dennis}
 
+    # Rotate database backups in a background thread. It isn't a daemon thread, so that quitting waits for it.
+    def rotate_backups():
+        """Rotate database backups, and log the outcome."""
+        try:
+            if not backup.rotate(config["database"]["filename"], config["database"]["backups"],
+                                 config["database"]["engine"]):
+                log.info("Database unchanged since the last backup, not rotating backups: {0}".format(
+                    config["database"]["filename"]))
+        except:
+            log.error("Could not finish rotating backups for database: {0}".format(config["database"]["filename"]))
+            log.error(traceback.format_exc(1))
+    if backup_pending:
+        threading.Thread(target=rotate_backups).start()
+
     # Try to start a command prompt session with a history file.
     # Otherwise start a sessionless prompt without history.
     try:
@@ -0,0 +1,497 @@
+#######################
+# Dennis MUD          #
+# dbbench.py          #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This is the Dennis Database Benchmark.
+# To use it, copy it into your main Dennis directory and run it
+# with a list of world sizes as its arguments. It builds a synthetic
+# world of each size in a temporary directory, and reports the latency
+# of common DatabaseManager queries against it, and how many bytes
+# each storage engine writes for typical changes.
+# With "memory" as the first argument, it instead reports how much
+# memory a world of each size takes as dicts, as compact records, and
+# as compact records sharing their repeated data.
+# With "startup" as the first argument, it instead reports the time and
+# peak memory taken to load a world of each size with each engine, and
+# checks that worlds loaded from snapshots match the world files.
+# With "journal" as the first argument, it instead checks that the journal
+# engine recovers a world of each size from a journal torn mid-record.
+
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tinydb import TinyDB, Query
+
+try:
+    from lib import database
+    from lib import records
+except:
+    print("Can't find DatabaseManager. You should move this script to the Dennis root directory.")
+    sys.exit(1)
+
+
+# How many times to repeat each query when timing it.
+REPEAT = 200
+
+# How many users are moving around when counting bytes written.
+ACTIVE_USERS = 10
+
+# Defaults for the DatabaseManager, in case it needs to initialize anything.
+DEFAULTS = {
+    "first_room": {"name": "Nexus", "desc": "", "sealed": {"inbound": False, "outbound": False}},
+    "first_user": {"nick": "<world>", "desc": "", "autolook": {"enabled": False}, "chat": {"enabled": True}}
+}
+
+
+# DatabaseManager will expect a logger, so we'll give it this stump.
+class Log:
+    """Stand-in for Twisted's logger.
+    """
+    def debug(self, msg, **kwargs):
+        pass
+
+    def info(self, msg, **kwargs):
+        pass
+
+    def warn(self, msg, **kwargs):
+        print("[dbbench#warn]", msg.format(**kwargs))
+
+    def error(self, msg, **kwargs):
+        print("[dbbench#error]", msg.format(**kwargs))
+
+    def critical(self, msg, **kwargs):
+        print("[dbbench#critical]", msg.format(**kwargs))
+
+
+def make_documents(n, size):
+    """Make the synthetic room, item, and user documents with the given ID.
+
+    Every room has a description, two exits, and a few items, so that documents are roughly the size of a real world.
+
+    :param n: The ID of the documents.
+    :param size: The number of rooms, items, and users in the world.
+
+    :return: Dict of table names to documents.
+    """
+    return {
+        "rooms": {
+            "id": n, "name": "room {0}".format(n), "desc": "A synthetic room. " * 10, "owners": ["user0"],
+            "users": ["user{0}".format(n)], "entrances": [(n - 1) % size], "items": [n, (n + 1) % size],
+            "exits": [{"dest": (n + 1) % size, "name": "exit {0}".format(x), "desc": "", "owners": ["user0"],
+                       "key": None, "key_hidden": False, "locked": False,
+                       "action": {"go": "", "locked": "", "entrance": ""}} for x in range(2)],
+            "sealed": {"inbound": False, "outbound": False}
+        },
+        "items": {
+            "id": n, "name": "item {0}".format(n), "desc": "A synthetic item.", "action": "",
+            "owners": ["user0"], "glued": False, "duplified": False, "telekey": None
+        },
+        "users": {
+            "name": "user{0}".format(n), "nick": "User {0}".format(n), "desc": "", "passhash": "0", "room": n,
+            "inventory": [], "pronouns": "neutral", "wizard": False, "autolook": {"enabled": False},
+            "chat": {"enabled": True, "ignored": []}
+        }
+    }
+
+
+def make_world(filename, size):
+    """Write a synthetic world with the given number of rooms, items, and users.
+
+    :param filename: The filename to write the world to.
+    :param size: The number of rooms, items, and users to create.
+
+    :return: None
+    """
+    rooms, items, users = {}, {}, {}
+    for n in range(size):
+        documents = make_documents(n, size)
+        rooms[str(n + 1)] = documents["rooms"]
+        items[str(n + 1)] = documents["items"]
+        users[str(n + 1)] = documents["users"]
+    with open(filename, "w") as f:
+        json.dump({"_info": {"1": {"version": database.DB_VERSION}}, "rooms": rooms, "items": items,
+                   "users": users}, f)
+
+
+def make_engine_world(filename, engine, size):
+    """Write a synthetic world for the given storage engine.
+
+    :param filename: The filename to write the world to.
+    :param engine: The name of the storage engine. One of the keys of database.ENGINES.
+    :param size: The number of rooms, items, and users to create.
+
+    :return: None
+    """
+    make_world(filename + ".src", size)
+    with open(filename + ".src") as f:
+        data = json.load(f)
+    os.remove(filename + ".src")
+    storage = database.ENGINES[engine](filename)
+    storage.write(data)
+    storage.close()
+
+
+def written(dbman, size):
+    """Make typical changes to the world, each in its own transaction, and count the bytes written.
+
+    Each change moves one of a few active users to the next room, like the go command, and toggles the duplified flag
+    of an item belonging to them.
+
+    :param dbman: The DatabaseManager.
+    :param size: The world size.
+
+    :return: Average bytes written per change.
+    """
+    start = dbman.bytes_written()
+    for _ in range(REPEAT):
+        n = random.randrange(min(size, ACTIVE_USERS))
+        with dbman.transaction():
+            user = dbman.user_by_name("user{0}".format(n))
+            oldroom = dbman.room_by_id(user["room"], clean=False)
+            newroom = dbman.room_by_id((user["room"] + 1) % size, clean=False)
+            if user["name"] in oldroom["users"]:
+                oldroom["users"].remove(user["name"])
+                dbman.upsert_room(oldroom)
+            newroom["users"].append(user["name"])
+            dbman.upsert_room(newroom)
+            user["room"] = newroom["id"]
+            dbman.upsert_user(user)
+            item = dbman.item_by_id(n)
+            item["duplified"] = not item["duplified"]
+            dbman.upsert_item(item)
+    return (dbman.bytes_written() - start) / REPEAT
+
+
+def timed(func, size):
+    """Time a query function against random ids.
+
+    :param func: The function to call with a random id in [0, size).
+    :param size: The world size.
+
+    :return: Average latency in microseconds.
+    """
+    ids = [random.randrange(size) for _ in range(REPEAT)]
+    start = time.perf_counter()
+    for n in ids:
+        func(n)
+    return (time.perf_counter() - start) / REPEAT * 1000000
+
+
+def bench(size):
+    """Build a world of the given size and report query latency.
+
+    :param size: The number of rooms, items, and users to create.
+
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "world.json")
+        make_world(filename, size)
+        print("World size {0} ({1} bytes):".format(size, os.path.getsize(filename)))
+
+        # Baseline, with TinyDB's default storage which reads the world file for every query.
+        baseline = TinyDB(filename)
+        q = Query()
+        print("  {0:<24} {1:>12.1f} us".format("tinydb search (json)",
+                                              timed(lambda n: baseline.table("rooms").search(q.id == n), size)))
+        baseline.close()
+
+        # The DatabaseManager.
+        dbman = database.DatabaseManager(filename, DEFAULTS, log=Log())
+        if not dbman._startup():
+            return
+        print("  {0:<24} {1:>12.1f} us".format("room_by_id", timed(lambda n: dbman.room_by_id(n, clean=False), size)))
+        print("  {0:<24} {1:>12.1f} us".format("item_by_id", timed(dbman.item_by_id, size)))
+        print("  {0:<24} {1:>12.1f} us".format("user_by_name",
+                                              timed(lambda n: dbman.user_by_name("user{0}".format(n)), size)))
+        print("  {0:<24} {1:>12.1f} us".format("rooms.all", timed(lambda n: dbman.rooms.all(), size)))
+        dbman._unlock()
+
+        # Bytes written by each storage engine, writing whole documents and then only changed fields.
+        for engine in database.ENGINES:
+            for field_diffs in [False, True]:
+                # The json engine always rewrites the whole world, and the paged engine whole shards.
+                if engine in ["json", "paged"] and field_diffs:
+                    continue
+                filename = os.path.join(tmp, "world.{0}.{1}".format(engine, int(field_diffs)))
+                make_engine_world(filename, engine, size)
+                dbman = database.DatabaseManager(filename, DEFAULTS, log=Log(), engine=engine)
+                if not dbman._startup():
+                    return
+                dbman.database.storage.field_diffs = field_diffs
+                print("  {0:<24} {1:>12.1f} bytes".format("write ({0}{1})".format(
+                    engine, ", field diffs" if field_diffs else ""), written(dbman, size)))
+
+                # How often the paged engine found what it needed in memory.
+                stats = dbman.paging_stats()
+                if stats:
+                    hits = 100 * stats["hits"] / max(stats["hits"] + stats["misses"], 1)
+                    print("  {0:<24} {1:>12.1f} %".format("page hits ({0})".format(engine), hits))
+                dbman._unlock()
+
+
+def bench_memory(size):
+    """Build each table of a world of the given size in memory, first as dicts, then as records, and then as records
+    sharing their repeated data, and report the memory it takes.
+
+    :param size: The number of rooms, items, and users to create.
+
+    :return: None
+    """
+    print("World size {0}, in memory:".format(size))
+    for table in ["rooms", "items", "users"]:
+        results = []
+        for use_records, use_sharing in [(False, False), (True, False), (True, True)]:
+            tracemalloc.start()
+            documents = {}
+            for n in range(size):
+                # Round trip through JSON so that no strings are shared, just like after loading a world file.
+                document = json.loads(json.dumps(make_documents(n, size)[table]))
+                documents[str(n + 1)] = records.TABLES[table](document) if use_records else document
+            if use_sharing:
+                records.share_world({table: documents})
+            results.append(tracemalloc.get_traced_memory()[0])
+            tracemalloc.stop()
+            del documents
+        print("  {0:<8} {1:>9.1f} MB dicts {2:>9.1f} MB records ({3:.0f}%) {4:>9.1f} MB shared ({5:.0f}%)".format(
+            table, results[0] / 1048576, results[1] / 1048576, results[1] * 100 / results[0],
+            results[2] / 1048576, results[2] * 100 / results[0]))
+
+
+def rss(field="VmRSS"):
+    """Get the resident memory of this process. Only works on Linux.
+
+    :param field: The field of /proc/self/status to read. VmRSS for the current resident memory, or VmHWM for the peak.
+
+    :return: Resident memory in bytes.
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+
+def startup_child(filename, engine, use_records, use_snapshot):
+    """Load a world and print its load time, peak memory, and memory afterwards, as JSON. This runs in a separate
+    process for each world, so that the peak memory of one doesn't hide the next. Also print where the world was
+    loaded from, and a digest of its contents to compare loads with.
+
+    :param filename: The filename of the world.
+    :param engine: The name of the storage engine. One of the keys of database.ENGINES.
+    :param use_records: Whether to keep documents as compact records.
+    :param use_snapshot: Whether to use a binary snapshot.
+
+    :return: None
+    """
+    before = rss()
+    start = time.perf_counter()
+    dbman = database.DatabaseManager(filename, DEFAULTS, log=Log(), engine=engine, records=use_records,
+                                     snapshot=use_snapshot)
+    if not dbman._startup():
+        return
+    seconds = time.perf_counter() - start
+    after = rss()
+
+    # Unlike getrusage(), the peak in /proc is not inherited from the parent process.
+    peak = rss("VmHWM")
+    world = {table: dict(documents.items()) if hasattr(documents, "items") else documents
+             for table, documents in dbman.database.storage.read().items()}
+    digest = hashlib.sha256(json.dumps(world, sort_keys=True, default=records.serialize).encode()).hexdigest()
+    print(json.dumps({"seconds": seconds, "peak": peak - before, "after": after - before, "digest": digest,
+                      "loaded_from": getattr(dbman.database.storage, "loaded_from", None)}))
+    dbman._unlock()
+
+
+def run_startup_child(filename, engine, use_records, use_snapshot):
+    """Run startup_child() in a separate process.
+
+    :param filename: The filename of the world.
+    :param engine: The name of the storage engine. One of the keys of database.ENGINES.
+    :param use_records: Whether to keep documents as compact records.
+    :param use_snapshot: Whether to use a binary snapshot.
+
+    :return: The dict it printed.
+    """
+    result = subprocess.run([sys.executable, __file__, "startup-child", filename, engine,
+                             str(int(use_records)), str(int(use_snapshot))],
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    if result.returncode or not result.stdout.strip():
+        raise RuntimeError("Loading the {0} world failed.".format(engine))
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def check_snapshot(engine, first, second):
+    """Make sure a world was loaded from its snapshot on a restart, and came back the same as it was.
+
+    :param engine: The name of the storage engine.
+    :param first: The startup_child() result from the load that wrote the snapshot.
+    :param second: The startup_child() result from the restart.
+
+    :return: None
+    """
+    if second["loaded_from"] != "snapshot":
+        raise RuntimeError("The {0} world was not loaded from its snapshot on restart.".format(engine))
+    if second["digest"] != first["digest"]:
+        raise RuntimeError("The {0} world loaded from its snapshot doesn't match the world file.".format(engine))
+
+
+def bench_startup(size):
+    """Build a world of the given size for each storage engine, and report the time and peak memory taken to load it,
+    in a separate process each time.
+
+    :param size: The number of rooms, items, and users to create.
+
+    :return: None
+    """
+    if not os.path.exists("/proc/self/status"):
+        print("Measuring startup memory only works on Linux.")
+        return
+    print("World size {0}, starting up:".format(size))
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in database.ENGINES:
+            # A brand new world must come back from its snapshot on the second start, too.
+            if engine in ["json", "journal"]:
+                for use_records in [False, True]:
+                    filename = os.path.join(tmp, "new.{0}.{1}".format(engine, int(use_records)))
+                    first = run_startup_child(filename, engine, use_records, True)
+                    check_snapshot(engine, first, run_startup_child(filename, engine, use_records, True))
+
+            filename = os.path.join(tmp, "world.{0}".format(engine))
+            make_engine_world(filename, engine, size)
+            for use_records in [False, True]:
+                for use_snapshot in [False, True] if engine in ["json", "journal"] else [False]:
+                    # Load once to write the snapshot, then check that the restart loads the same world from it.
+                    if use_snapshot:
+                        first = run_startup_child(filename, engine, use_records, True)
+                    result = run_startup_child(filename, engine, use_records, use_snapshot)
+                    if use_snapshot:
+                        check_snapshot(engine, first, result)
+                    print("  {0:<32} {1:>7.2f} s {2:>9.1f} MB peak {3:>9.1f} MB after ({4:.1f}x)".format(
+                        "{0}{1}{2}".format(engine, ", records" if use_records else "",
+                                           ", snapshot" if use_snapshot else ""),
+                        result["seconds"], result["peak"] / 1048576, result["after"] / 1048576,
+                        result["peak"] / result["after"]))
+
+
+def check_journal(size):
+    """Check crash recovery of the journal engine. Flush several changes to the journal of a world of the given size,
+    tear the last journal record in half as if we crashed while writing it, and make sure that reopening the world
+    replays every earlier record and drops the torn one.
+
+    :param size: The number of rooms, items, and users to create.
+
+    :return: None
+    """
+    print("World size {0}, recovering a torn journal:".format(size))
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "world.journal")
+        make_world(filename, size)
+        storage = database.ENGINES["journal"](filename, journal_limit=2 ** 40)
+
+        # Flush a few records: whole new documents, then only changed fields, then a removal, and one more.
+        # Remember what the world looked like after each flush.
+        states = []
+        for flush in range(4):
+            storage.deferred = True
+            for n in range(0, size, max(size // 10, 1)):
+                room = json.loads(json.dumps(storage.read()["rooms"][str(n + 1)]))
+                room["desc"] = "Changed in flush {0}.".format(flush)
+                storage.update("rooms", str(n + 1), room)
+            if flush == 2:
+                storage.update("items", "1", None)
+            storage.flush()
+            states.append(json.dumps(storage.read(), sort_keys=True))
+
+        # Crash halfway through writing the last record. The journal file is left as it is.
+        with open(filename + ".journal", "rb") as f:
+            lines = f.read().splitlines(keepends=True)
+        with open(filename + ".journal", "r+b") as f:
+            f.truncate(sum(len(line) for line in lines[:-1]) + len(lines[-1]) // 2)
+
+        # Recover, and make sure we got the world as of the flush before the torn one.
+        recovered = database.ENGINES["journal"](filename, journal_limit=2 ** 40)
+        replayed, discarded = recovered.replayed, recovered.discarded
+        if json.dumps(recovered.read(), sort_keys=True) != states[-2]:
+            raise RuntimeError("The recovered world doesn't match the world as of the last complete record.")
+        if not discarded or replayed != sum(len(json.loads(line)["changes"]) for line in lines[:-1]):
+            raise RuntimeError("Expected {0} complete records to be replayed and the torn one discarded.".format(
+                len(lines) - 1))
+        recovered.close()
+        print("  replayed {0} records ({1} changes), discarded {2} bytes".format(len(lines) - 1, replayed, discarded))
+
+
+def main():
+    """Main Program
+    """
+    print("Dennis Database Benchmark")
+
+    # Check command line arguments, and give help if needed.
+    if len(sys.argv) < 2 or sys.argv[1] in ["help", "-h", "--help", "-help", "?", "-?"]:
+        print("This benchmark reports database query latency against synthetic worlds of the given sizes.")
+        print("With \"memory\", it reports how much memory the worlds take as dicts, records, and shared records")
+        print("instead.")
+        print("With \"startup\", it reports the time and peak memory taken to load the worlds instead.")
+        print("With \"journal\", it checks that the journal engine recovers the worlds from a torn journal instead.")
+        print("Usage: {0} [memory|startup|journal] <size> [size...]".format(sys.argv[0]))
+        return 0
+
+    # Load a world in a child process for the startup benchmark.
+    if sys.argv[1] == "startup-child":
+        startup_child(sys.argv[2], sys.argv[3], sys.argv[4] == "1", sys.argv[5] == "1")
+        return 0
+
+    # Run the startup benchmark for each world size.
+    if sys.argv[1] == "startup":
+        for size in sys.argv[2:]:
+            bench_startup(int(size))
+        return 0
+
+    # Check journal recovery for each world size.
+    if sys.argv[1] == "journal":
+        for size in sys.argv[2:]:
+            check_journal(int(size))
+        return 0
+
+    # Run the memory benchmark for each world size.
+    if sys.argv[1] == "memory":
+        for size in sys.argv[2:]:
+            bench_memory(int(size))
+        return 0
+
+    # Run the benchmark for each world size.
+    for size in sys.argv[1:]:
+        bench(int(size))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#######################
+# Dennis MUD          #
+# dbconvert.py        #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This is the Dennis Database Converter.
+# To use it, copy it into your main Dennis directory and run it
+# with the source engine and filename and the destination engine
+# and filename as its arguments. It copies a whole world from one
+# database engine to another, for example from an existing
+# TinyDB world.json to a new SQLite database.
+
+from os import path
+import sys
+
+try:
+    from lib import database
+except:
+    print("Can't find DatabaseManager. You should move this script to the Dennis root directory.")
+    sys.exit(1)
+
+
+def main():
+    """Main Program
+    """
+    print("Dennis Database Converter")
+
+    # Check command line arguments, and give help if needed.
+    if len(sys.argv) != 5 or sys.argv[1] in ["help", "-h", "--help", "-help", "?", "-?"]:
+        print("This converter copies a world from one database engine to another.")
+        print("Available engines: {0}".format(', '.join(database.ENGINES.keys())))
+        print("Usage: {0} <source_engine> <source> <destination_engine> <destination>".format(sys.argv[0]))
+        return 0
+
+    # Make sure the engines exist.
+    for engine in [sys.argv[1], sys.argv[3]]:
+        if engine not in database.ENGINES:
+            print("Unknown database engine: {0}".format(engine))
+            return 2
+
+    # Make sure the source exists and is not in use, and that we aren't overwriting anything.
+    if not path.exists(sys.argv[2]):
+        print("Database file does not exist: {0}".format(sys.argv[2]))
+        return 2
+    if path.exists(sys.argv[2] + ".lock"):
+        print("Lockfile exists for database, is the server running?: {0}".format(sys.argv[2]))
+        return 2
+    if path.exists(sys.argv[4]):
+        print("Destination file already exists: {0}".format(sys.argv[4]))
+        return 2
+
+    # Load the whole world from the source, and write it all to the destination in one go.
+    source = database.ENGINES[sys.argv[1]](sys.argv[2])
+    world = source.read()
+    if not world:
+        print("Database is empty: {0}".format(sys.argv[2]))
+        source.close()
+        return 3
+    destination = database.ENGINES[sys.argv[3]](sys.argv[4])
+    destination.write(world)
+    destination.close()
+    source.close()
+
+    # Finished.
+    for table in sorted(world.keys()):
+        print("Converted {0} documents in table: {1}".format(len(world[table]), table))
+    print("Successfully converted database: {0} -> {1}".format(sys.argv[2], sys.argv[4]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#######################
+# Dennis MUD          #
+# dbrestore.py        #
+# Copyright 2018-2022 #
+# Sei Satzparad       #
+#######################
+
+# **********
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# **********
+
+# This is the Dennis Database Restorer.
+# To use it, copy it into your main Dennis directory and run it
+# with the online backup directory of a world (<world>.backups)
+# and the filename of a new world file as its arguments. It rebuilds
+# the world from the newest online backup, by applying its base and
+# then its deltas. Give a sequence number to restore an older backup.
+# Use dbconvert.py afterwards to move the world to another engine.
+
+from os import path
+import sys
+
+try:
+    from lib import backup
+    from lib import database
+except:
+    print("Can't find DatabaseManager. You should move this script to the Dennis root directory.")
+    sys.exit(1)
+
+
+def main():
+    """Main Program
+    """
+    print("Dennis Database Restorer")
+
+    # Check command line arguments, and give help if needed.
+    if len(sys.argv) not in [3, 4] or sys.argv[1] in ["help", "-h", "--help", "-help", "?", "-?"]:
+        print("This restorer rebuilds a world file from the online backups of a world.")
+        print("Usage: {0} <backup_directory> <destination> [sequence_number]".format(sys.argv[0]))
+        return 0
+
+    # Make sure the backups exist, and that we aren't overwriting anything.
+    if not path.isdir(sys.argv[1]):
+        print("Backup directory does not exist: {0}".format(sys.argv[1]))
+        return 2
+    if path.exists(sys.argv[2]):
+        print("Destination file already exists: {0}".format(sys.argv[2]))
+        return 2
+    if len(sys.argv) == 4 and not sys.argv[3].isdigit():
+        print("Sequence number must be a number: {0}".format(sys.argv[3]))
+        return 2
+
+    # Rebuild the world.
+    try:
+        seq, world = backup.restore(sys.argv[1], int(sys.argv[3]) if len(sys.argv) == 4 else None)
+    except FileNotFoundError as e:
+        print(e)
+        return 3
+    if not world:
+        print("No backups found in: {0}".format(sys.argv[1]))
+        return 3
+
+    # Write it out as a JSON world file.
+    destination = database.ENGINES["json"](sys.argv[2])
+    destination.write(world)
+    destination.close()
+
+    # Finished.
+    for table in sorted(world.keys()):
+        print("Restored {0} documents in table: {1}".format(len(world[table]), table))
+    print("Successfully restored backup {0} to database: {1}".format(seq, sys.argv[2]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())